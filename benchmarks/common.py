@@ -0,0 +1,27 @@
+import os
+import tempfile
+import time
+
+
+def measure(function, fixtures, repeat):
+    """ Returns the best time (seconds) of calling function for all fixtures, and the results """
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        results = [function(fixture) for fixture in fixtures]
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+
+def make_home():
+    """
+    Points the home directory at a new temporary folder with an empty League folder in it, so ~/.lolbuilds
+    starts empty and nothing is written to the real one, returns the paths of the home and League folders.
+    """
+    home = tempfile.mkdtemp(prefix="lolbuilds-benchmark-")
+    os.environ["HOME"] = home
+    os.environ["USERPROFILE"] = home
+    league_path = os.path.join(home, "League of Legends")
+    os.makedirs(league_path)
+    return home, league_path
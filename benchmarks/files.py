@@ -0,0 +1,215 @@
+"""
+Benchmarks formatting and saving item set files, the templated serializer against building
+the whole layout as a dict and serializing it with json.dumps, and writing them, both when every file changed
+and when every file is already up to date and left untouched.
+
+The item sets are random builds of the items the local stand-in site serves, which are the same on every run.
+The site only serves the Data Dragon files, no pages are fetched.
+
+Usage (from the repository root):
+    python -m benchmarks.files --champions 160 --repeat 5
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+
+from benchmarks.common import make_home, measure
+
+
+def get_block_items(item_ids):
+    """ Returns the items of a block, with the count of every item id in the order they first appear """
+    counts = {}
+    for item_id in item_ids:
+        counts[item_id] = counts.get(item_id, 0) + 1
+
+    return [{"count": count, "id": str(item_id)} for item_id, count in counts.items()]
+
+
+def build(champion, item_set, version, source_name, roles):
+    """
+    Builds an item set file the straightforward way, the whole layout as a dict serialized with json.dumps,
+    returns a (path, bytes) tuple like utils.files.Template.build, which has to return the same bytes.
+    """
+    from utils import ddragon, files
+
+    trinkets = ddragon.get_trinkets()
+    trinket = get_block_items(trinkets[:1])
+
+    output = {
+        "title": f"{source_name.capitalize()}{(' ' + item_set.role) if roles else ''} {version}",
+        "type": "custom",
+        "map": "any",
+        "mode": "any",
+        "priority": False,
+        "champion": champion["name"],
+        "blocks": [
+            {
+                "items": get_block_items(item_set.frequent.starters) + trinket,
+                "type": "Most Frequent Starters"
+            },
+            {
+                "items": get_block_items(item_set.highest.starters) + trinket,
+                "type": "Highest Win % Starters"
+            },
+            {
+                "items": get_block_items(item_set.frequent.full),
+                "type": "Most Frequent Build"
+            },
+            {
+                "items": get_block_items(item_set.highest.full),
+                "type": "Highest Win % Build"
+            },
+            {
+                "items": get_block_items(ddragon.get_consumables()),
+                "type": "Consumables | Frequent: " + files._format_skill_order(item_set.frequent.skill_order)
+            },
+            {
+                "items": get_block_items(trinkets),
+                "type": "Trinkets | Wins: " + files._format_skill_order(item_set.highest.skill_order)
+            }
+        ]
+    }
+
+    if roles:
+        output["sortrank"] = item_set.sort_rank
+
+    item_set_path = os.path.join(
+        files.get_champion_path(champion["name"]), f"{files.get_file_name(item_set, source_name, roles)}.json")
+
+    return item_set_path, json.dumps(output).encode("utf-8")
+
+
+def get_fixtures(site, count):
+    """ Returns (champion, item_set) tuples, one for every role of count champions """
+    from utils import records
+
+    def build(rng):
+        items = {
+            "full": rng.sample(site.ITEMS, 6),
+            "starters": rng.sample(site.STARTERS, 2)
+        }
+        return records.Build.from_source(items, site._skills(rng))
+
+    fixtures = []
+    for name, display_name, key, roles in site.get_champions(count):
+        rng = random.Random(f"{name}files")
+        champion = records.Champion(name, display_name, key, list(site.ROLES))
+        for sort_rank, role in enumerate(site.ROLES):
+            fixtures.append((champion, records.ItemSet(
+                build(rng), build(rng), role, len(site.ROLES) - sort_rank)))
+    return fixtures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--champions", type=int, default=160,
+                        help="number of champions, each with an item set for all 5 roles")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="times each path is measured, the best time is kept")
+    parser.add_argument("--json", action="store_true",
+                        help="print the results as json")
+    args = parser.parse_args()
+
+    home, league_path = make_home()
+
+    from benchmarks import site
+    from utils import config, ddragon, files, http
+
+    server = site.Site(args.champions, 0).start()
+    server.redirect()
+
+    try:
+        config.reload()
+        http.reset()
+        ddragon.reset()
+        config.save("path", league_path)
+        version = "10.20"
+
+        fixtures = get_fixtures(site, args.champions)
+
+        def built(fixture):
+            champion, item_set = fixture
+            return build(champion, item_set, version, "benchmark", True)
+
+        def templated(fixture):
+            champion, item_set = fixture
+            return template.build(champion, item_set)
+
+        # the Data Dragon index is loaded before measuring
+        template = files.Template(version, "benchmark", True)
+        built_seconds, expected = measure(built, fixtures, args.repeat)
+        templated_seconds, results = measure(templated, fixtures, args.repeat)
+
+        if results != expected:
+            raise SystemExit("The templated item sets differ from the built item sets")
+
+        def saver(version):
+            def save(fixture):
+                champion, item_set = fixture
+                for path, data in writer.format(champion, [item_set], version, "benchmark", True):
+                    writer.write(path, data, "benchmark")
+            return save
+
+        def save_all(version):
+            """ Formats and writes every item set with a version in its title, returns the time and how many were written """
+            written = writer.written
+            seconds, _ = measure(saver(version), fixtures, 1)
+            return seconds, writer.written - written
+
+        # the folders and files are made before measuring
+        writer = files.Writer()
+        save_all("10.19")
+
+        # every repeat has another version in the titles, so every file differs from the one on disk and is replaced
+        written_seconds = None
+        for run in range(args.repeat):
+            seconds, written = save_all(f"10.{20 + run}")
+            if written != len(fixtures):
+                raise SystemExit(f"Only {written} of {len(fixtures)} changed item sets were written")
+            written_seconds = seconds if written_seconds is None else min(written_seconds, seconds)
+
+        # the same item sets again, all of them are read and compared but none are written
+        unchanged_seconds = None
+        for run in range(args.repeat):
+            seconds, written = save_all(f"10.{19 + args.repeat}")
+            if written != 0:
+                raise SystemExit(f"{written} unchanged item sets were written")
+            unchanged_seconds = seconds if unchanged_seconds is None else min(unchanged_seconds, seconds)
+    finally:
+        server.stop()
+        shutil.rmtree(home, ignore_errors=True)
+
+    item_sets = len(fixtures)
+    results = {
+        "item_sets": item_sets,
+        "built_ms": round(1000 * built_seconds, 3),
+        "templated_ms": round(1000 * templated_seconds, 3),
+        "written_ms": round(1000 * written_seconds, 3),
+        "unchanged_ms": round(1000 * unchanged_seconds, 3),
+        "built_per_second": round(item_sets / built_seconds),
+        "templated_per_second": round(item_sets / templated_seconds),
+        "written_per_second": round(item_sets / written_seconds),
+        "unchanged_per_second": round(item_sets / unchanged_seconds),
+        "speedup": round(built_seconds / templated_seconds, 1)
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print()
+    print(f"{item_sets} item sets ({args.champions} champions x {len(site.ROLES)} roles)")
+    print(f"{'path':>12} {'ms':>10} {'item sets/s':>12}")
+    print(f"{'built':>12} {results['built_ms']:>10} {results['built_per_second']:>12}")
+    print(f"{'templated':>12} {results['templated_ms']:>10} {results['templated_per_second']:>12}")
+    print(f"{'written':>12} {results['written_ms']:>10} {results['written_per_second']:>12}")
+    print(f"{'unchanged':>12} {results['unchanged_ms']:>10} {results['unchanged_per_second']:>12}")
+    print(f"templated is {results['speedup']}x faster than built")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmarks Source.import_item_sets end to end against a local stand-in for the real sites.
+
+Usage (from the repository root):
+    python -m benchmarks.imports --champions 40 --latency 0.05 --concurrency 1 4 8 16
+"""
+
+import argparse
+import json
+import shutil
+import time
+
+from benchmarks.common import make_home
+
+
+def run(sources, concurrency, host_rate=None):
+    """ Imports from all sources into a fresh League folder and ~/.lolbuilds, returns the measurements """
+    from utils import config, ddragon, http, manifest, skills
+
+    home, league_path = make_home()
+
+    # start from an empty config, page cache and memo
+    config.reload()
+    http.reset()
+    skills.reset()
+    ddragon.reset()
+    config.save("path", league_path)
+    config.save("concurrency", concurrency)
+    config.save("host_rate", host_rate)
+
+    before = http.stats()
+    started = time.perf_counter()
+
+    champions = 0
+    for source in sources:
+        source.import_item_sets()
+        champions += len(set(manifest.split_key(key)[0]
+                             for key in manifest.load(source.name)))
+
+    elapsed = time.perf_counter() - started
+    requests = http.stats()["requests"] - before["requests"]
+
+    shutil.rmtree(home, ignore_errors=True)
+
+    return {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "requests": requests,
+        "requests_per_second": round(requests / elapsed, 1),
+        "champions_per_second": round(champions / elapsed, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--champions", type=int, default=20,
+                        help="number of champions served by each site")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="seconds every response is delayed")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16],
+                        help="concurrency levels to measure")
+    parser.add_argument("--host-rate", type=float,
+                        help="requests per second sent to each site (default: the default of utils.ratelimit)")
+    parser.add_argument("--sources", nargs="+", default=["opgg", "probuilds", "championgg"],
+                        help="sources to import from")
+    parser.add_argument("--json", action="store_true",
+                        help="print the results as json")
+    args = parser.parse_args()
+
+    from benchmarks.site import Site
+    from sources import Championgg, Opgg, Probuilds
+
+    site = Site(args.champions, args.latency).start()
+    site.redirect()
+
+    sources = [source for source in [Opgg(), Probuilds(), Championgg()]
+               if source.name in args.sources]
+
+    results = []
+    try:
+        for concurrency in args.concurrency:
+            results.append(run(sources, concurrency, args.host_rate))
+    finally:
+        site.stop()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print()
+    print(f"{args.champions} champions, {1000 * args.latency:.0f} ms latency, sources: {', '.join(args.sources)}")
+    print(f"{'concurrency':>12} {'seconds':>10} {'requests':>10} {'requests/s':>12} {'champions/s':>12}")
+    for result in results:
+        print(f"{result['concurrency']:>12} {result['seconds']:>10} {result['requests']:>10} "
+              f"{result['requests_per_second']:>12} {result['champions_per_second']:>12}")
+
+
+if __name__ == "__main__":
+    main()
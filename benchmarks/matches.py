@@ -0,0 +1,77 @@
+"""
+Benchmarks picking the highest KDA build from the probuilds match fragments,
+the one pass extractor against parsing every fragment with BeautifulSoup.
+
+The fixtures are the champBuilds responses of the local stand-in site, which are the same on every run.
+
+Usage (from the repository root):
+    python -m benchmarks.matches --champions 20 --matches 20 --repeat 5
+"""
+
+import argparse
+import heapq
+import json
+
+from benchmarks.common import measure
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--champions", type=int, default=20,
+                        help="number of champBuilds responses")
+    parser.add_argument("--matches", type=int, default=20,
+                        help="match fragments in each response")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="times each path is measured, the best time is kept")
+    parser.add_argument("--json", action="store_true",
+                        help="print the results as json")
+    args = parser.parse_args()
+
+    from benchmarks import site
+    from sources import probuilds
+
+    fixtures = [json.loads(site.probuilds_builds(key, args.matches))["matches"]
+                for name, display_name, key, roles in site.get_champions(args.champions)]
+
+    def parsed(matches):
+        # the old path: a soup for every fragment, then sorting every build
+        builds = [probuilds._parse_match(match) for match in matches]
+        builds.sort(key=lambda build: build[1], reverse=True)
+        return builds[0][0] if len(builds) > 0 else None
+
+    def extracted(matches):
+        best = heapq.nlargest(1, map(probuilds._extract_match, matches),
+                              key=lambda build: build[1])
+        return best[0][0] if len(best) > 0 else None
+
+    parsed_seconds, expected = measure(parsed, fixtures, args.repeat)
+    extracted_seconds, results = measure(extracted, fixtures, args.repeat)
+
+    if results != expected:
+        raise SystemExit("The extracted builds differ from the parsed builds")
+
+    fragments = args.champions * args.matches
+    results = {
+        "fragments": fragments,
+        "parsed_ms": round(1000 * parsed_seconds, 3),
+        "extracted_ms": round(1000 * extracted_seconds, 3),
+        "parsed_us_per_fragment": round(1e6 * parsed_seconds / fragments, 1),
+        "extracted_us_per_fragment": round(1e6 * extracted_seconds / fragments, 1),
+        "speedup": round(parsed_seconds / extracted_seconds, 1)
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print()
+    print(f"{fragments} match fragments ({args.champions} champions x {args.matches} matches)")
+    print(f"{'path':>12} {'ms':>10} {'us/fragment':>12}")
+    print(f"{'parsed':>12} {results['parsed_ms']:>10} {results['parsed_us_per_fragment']:>12}")
+    print(f"{'extracted':>12} {results['extracted_ms']:>10} {results['extracted_us_per_fragment']:>12}")
+    print(f"{results['speedup']}x faster")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""
+Synthetic stand-ins for the pages that op.gg, probuilds.net and champion.gg serve,
+with the markup the sources parse, the Data Dragon files of one patch, and a local HTTP server that serves them.
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+ROLES = ["Top", "Jungle", "Middle", "Bottom", "Support"]
+
+ITEMS = ["3006", "3020", "3047", "3111", "3031", "3036", "3072", "3094", "3153", "3046",
+         "3089", "3135", "3157", "3165", "3285", "3068", "3075", "3143", "3742", "6632"]
+STARTERS = ["1055", "1056", "1054", "3850", "3858", "3862", "1039", "2003", "2033", "2031"]
+TRINKETS = ["3340", "3363", "3364"]
+CONSUMABLES = ["2003", "2031", "2033", "2055", "2138", "2139", "2140"]
+
+DDRAGON_VERSIONS = ["10.20.1", "10.19.1"]
+
+
+def get_champions(count):
+    """ Returns count synthetic champions as (name, display_name, key, roles) tuples """
+    champions = []
+    for i in range(count):
+        rng = random.Random(i)
+        roles = rng.sample(ROLES, rng.randint(1, 3))
+        champions.append(
+            (f"Champion{i}", f"Champion {i}", str(1000 + i), roles))
+    return champions
+
+
+def _percent(rng):
+    return f"{rng.uniform(1, 70):.2f}%"
+
+
+def _skills(rng):
+    # three basic skills maxed in a random order with r at 6, 11 and 16
+    order = rng.sample(["Q", "W", "E"], 3)
+    skills = order + [order[0]]
+    for level in range(5, 19):
+        if level in (6, 11, 16):
+            skills.append("R")
+        else:
+            counts = {skill: skills.count(skill) for skill in order}
+            skills.append(next(skill for skill in order if counts[skill] < 5))
+    return skills
+
+
+def _item_img(item_id):
+    return f'<img src="//opgg-static.akamaized.net/images/lol/item/{item_id}.png?image=q_auto">'
+
+
+def opgg_statistics(champions):
+    champion_divs = []
+    for name, display_name, _, roles in champions:
+        positions = "".join(
+            f'<div class="champion-index__champion-item__position"><span>{role}</span></div>' for role in roles)
+        champion_divs.append(
+            f'<div class="champion-index__champion-item" data-champion-key="{name.lower()}"><a href="/champion/{name.lower()}">'
+            f'<div class="champion-index__champion-item__name">{display_name}</div>{positions}</a></div>')
+
+    padding = "<div class='filler'>" + "<span>lorem ipsum</span>" * 400 + "</div>"
+    return (f'<html><head><title>op.gg</title></head><body>{padding}<div class="champion-index__version">Version : 10.20</div>'
+            f'<div class="champion-index__champion-list">{"".join(champion_divs)}</div>{padding}</body></html>')
+
+
+def opgg_items(name, role):
+    rng = random.Random(f"{name}{role}items")
+
+    def rows(build):
+        return "".join(
+            f'<tr><td class="champion-stats__table__cell--data">{build()}</td>'
+            f'<td class="champion-stats__table__cell--pickrate">{_percent(rng)}<em>{rng.randint(10, 5000)}</em></td>'
+            f'<td class="champion-stats__table__cell--winrate">{_percent(rng)}</td></tr>' for _ in range(5))
+
+    def item_list(items, count):
+        return "<ul>" + "".join(f'<li class="champion-stats__list__item">{_item_img(item)}</li>' for item in rng.sample(items, count)) + "</ul>"
+
+    header = "<tr><th>Build</th><th>Pick rate</th><th>Win rate</th></tr>"
+    core = rows(lambda: item_list(ITEMS[3:], 3))
+    boots = rows(
+        lambda: f'<div class="champion-stats__single__item">{_item_img(rng.choice(ITEMS[:3]))}</div>')
+    starters = rows(lambda: item_list(STARTERS, 2))
+
+    padding = "<div class='filler'>" + "<span>lorem ipsum</span>" * 2000 + "</div>"
+    return (f"<html><body>{padding}"
+            f'<table class="champion-stats__table">{header}{core}</table>'
+            f'<table class="champion-stats__table">{header}{boots}</table>'
+            f'<table class="champion-stats__table">{header}{starters}</table>'
+            f"{padding}</body></html>")
+
+
+def opgg_skills(name, role):
+    rng = random.Random(f"{name}{role}skills")
+    rows = []
+    for _ in range(4):
+        skills = "".join(f"<td>{skill}</td>" for skill in _skills(rng))
+        rows.append(
+            f'<tr><td class="champion-stats__table__cell--data"><table><tr><td>Level</td></tr><tr>{skills}</tr></table></td>'
+            f'<td class="champion-stats__table__cell--pickrate">{_percent(rng)}<em>{rng.randint(10, 5000)}</em></td>'
+            f'<td class="champion-stats__table__cell--winrate">{_percent(rng)}</td></tr>')
+
+    padding = "<div class='filler'>" + "<span>lorem ipsum</span>" * 2000 + "</div>"
+    return (f'<html><body>{padding}<table class="champion-stats__table champion-stats__table--skill"><tbody>{"".join(rows)}</tbody></table>'
+            f"{padding}</body></html>")
+
+
+def ddragon_items():
+    items = {}
+    for item_id in ITEMS + STARTERS + TRINKETS + CONSUMABLES:
+        tags = []
+        if item_id in ITEMS[:4]:
+            tags.append("Boots")
+        if item_id in STARTERS:
+            tags.append("Lane")
+        if item_id in TRINKETS:
+            tags.append("Trinket")
+        if item_id in CONSUMABLES:
+            tags.append("Consumable")
+        items[item_id] = {
+            "name": f"Item {item_id}",
+            "from": ["1001"] if item_id in ITEMS else [],
+            "tags": tags,
+            "gold": {"total": 0, "purchasable": True},
+            "maps": {"11": True, "12": True}
+        }
+    return json.dumps({"type": "item", "version": DDRAGON_VERSIONS[0], "data": items})
+
+
+def ddragon_champions(champions):
+    return json.dumps({"type": "champion", "version": DDRAGON_VERSIONS[0],
+                       "data": {name: {"id": name, "key": key, "name": display_name} for name, display_name, key, _ in champions}})
+
+
+def probuilds_champion_list(champions):
+    return json.dumps({"champions": [{"id": name, "name": display_name, "key": key} for name, display_name, key, _ in champions]})
+
+
+def probuilds_match(rng):
+    items = "".join(
+        f'<img class="tooltip" data-id="{item}">' for item in rng.sample(ITEMS, 6) + ["3340"])
+    return (f'<div class="match"><div class="kda"><span class="green">{rng.randint(0, 20)}</span> / '
+            f'<span class="red">{rng.randint(0, 12)}</span> / <span class="gold">{rng.randint(0, 25)}</span></div>'
+            f'<div class="items">{items}</div></div>')
+
+
+def probuilds_builds(key, matches=20):
+    rng = random.Random(f"{key}builds")
+    starters = rng.sample(STARTERS, 2)
+    build_order = (f'<div class="build-list">\n<div class="tooltip" data-id="{starters[0]}">\n'
+                   f'<div class="tooltip" data-id="{starters[1]}"></div>\n<div class="tooltip" data-id="3340"></div>\n</div>\n</div>')
+    return json.dumps({"matches": [probuilds_match(rng) for _ in range(matches)], "buildOrder": build_order})
+
+
+def probuilds_details(key):
+    rng = random.Random(f"{key}details")
+    items = "".join(
+        f'<div class="bigData"><div class="tooltip" data-id="{item}"></div></div>' for item in rng.sample(ITEMS, 6))
+    padding = "<div class='filler'>" + "<span>lorem ipsum</span>" * 2000 + "</div>"
+    return f'<html><body>{padding}<div class="popular-section">{items}</div>{padding}</body></html>'
+
+
+def _championgg_skill_order(rng):
+    divs = []
+    for _ in range(2):
+        skills = _skills(rng)
+        rows = []
+        for skill in "QWER":
+            levels = "".join(
+                '<div class="selected"></div>' if s == skill else "<div></div>" for s in skills)
+            rows.append(
+                f'<div class="skill"><div class="skill-selections">{levels}</div></div>')
+        divs.append(
+            f'<div class="skill-order"><div class="skill">levels</div>{"".join(rows)}</div>')
+    return "".join(divs)
+
+
+def championgg_index(champions):
+    champion_divs = []
+    for name, display_name, key, roles in champions:
+        links = "".join(
+            f'<a style="display:block" href="/champion/{name}/{role}">{role}</a>' for role in roles)
+        champion_divs.append(
+            f'<div class="champ-height"><div class="champ-index-img {name}"></div><span class="champion-name">{display_name}</span>'
+            f'<div class="tsm-tooltip" data-id="{key}"></div>{links}</div>')
+    return f'<html><body><strong>10.20</strong>{"".join(champion_divs)}</body></html>'
+
+
+def championgg_champion(name, role=""):
+    rng = random.Random(f"{name}{role}championgg")
+    sections = []
+    for title, items, count in [("Most Frequent Completed Build", ITEMS, 6), ("Highest Win % Completed Build", ITEMS, 6),
+                                ("Most Frequent Starters", STARTERS, 2), ("Highest Win % Starters", STARTERS, 2)]:
+        links = "".join(
+            f'<a><img data-id="{item}"></a>' for item in rng.sample(items, count))
+        sections.append(f"<h2>{title}</h2><div>{links}</div>")
+    return f'<html><body>{"".join(sections)}{_championgg_skill_order(rng)}</body></html>'
+
+
+class Site:
+
+    def __init__(self, champions=20, latency=0.05):
+        """
+        Serves synthetic op.gg, probuilds.net and champion.gg pages on a local port.
+
+        Parameters:
+        - champions (int): number of champions listed by every site
+        - latency (float): seconds each response is delayed, to simulate a remote server
+        """
+        self.champions = get_champions(champions)
+        self.latency = latency
+        self.requests = 0
+
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(
+            ("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def render(self, path):
+        """ Returns (content_type, body) for a path, or None if it doesn't exist """
+        url = urlsplit(path)
+        parts = url.path.strip("/").split("/")
+        champions_by_name = {champion[0].lower(): champion for champion in self.champions}
+        champions_by_key = {champion[2]: champion for champion in self.champions}
+
+        if parts[0] == "opgg":
+            if parts[1:] == ["champion", "statistics"]:
+                return "text/html", opgg_statistics(self.champions)
+            if len(parts) == 6 and parts[1] == "champion" and parts[2] in champions_by_name:
+                if parts[5] == "item":
+                    return "text/html", opgg_items(parts[2], parts[4])
+                if parts[5] == "skill":
+                    return "text/html", opgg_skills(parts[2], parts[4])
+
+        elif parts[0] == "probuilds":
+            if parts[1:] == ["ajax", "championListNew"]:
+                return "application/json", probuilds_champion_list(self.champions)
+            if parts[1:] == ["ajax", "champBuilds"]:
+                key = parse_qs(url.query).get("championId", [""])[0]
+                if key in champions_by_key:
+                    return "application/json", probuilds_builds(key)
+            if parts[1:3] == ["champions", "details"] and parts[3] in champions_by_key:
+                return "text/html", probuilds_details(parts[3])
+
+        elif parts[0] == "ddragon":
+            if parts[1:] == ["api", "versions.json"]:
+                return "application/json", json.dumps(DDRAGON_VERSIONS)
+            if parts[1] == "cdn" and parts[2] in DDRAGON_VERSIONS and parts[3:5] == ["data", "en_US"]:
+                if parts[5:] == ["item.json"]:
+                    return "application/json", ddragon_items()
+                if parts[5:] == ["champion.json"]:
+                    return "application/json", ddragon_champions(self.champions)
+
+        elif parts[0] == "championgg":
+            if parts[1:] == [""] or parts[1:] == []:
+                return "text/html", championgg_index(self.champions)
+            if parts[1] == "champion" and parts[2].lower() in champions_by_name:
+                return "text/html", championgg_champion(parts[2], parts[3] if len(parts) > 3 else "")
+
+        return None
+
+    def _make_handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with site._lock:
+                    site.requests += 1
+
+                time.sleep(site.latency)
+
+                page = site.render(self.path)
+                if page is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                content_type, body = page
+                body = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header(
+                    "Content-Type", f"{content_type}; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def redirect(self):
+        """ Sends all requests LoLBuilds makes to the real sites to this server instead """
+        from utils import http
+
+        # every op.gg region gets the same pages
+        for host in ["euw.op.gg", "na.op.gg", "www.op.gg"]:
+            http.redirect(f"https://{host}", f"{self.url}/opgg")
+        http.redirect("https://www.probuilds.net", f"{self.url}/probuilds")
+        http.redirect("https://champion.gg", f"{self.url}/championgg")
+        http.redirect("https://ddragon.leagueoflegends.com",
+                      f"{self.url}/ddragon")
@@ -1,13 +1,21 @@
-import multiprocessing
-import os
-import sys
 import time
 
-from sources import SOURCES
-from utils import config, versions
+# used to measure how long it takes from starting the program until the first request is sent,
+# taken before the other imports so the time spent importing them counts
+STARTED = time.perf_counter()
+
+import argparse  # noqa: E402
+import os  # noqa: E402
+import sys  # noqa: E402
+
+from sources import SOURCES  # noqa: E402
+from utils import config, ddragon, http, metrics, scheduler, skills, snapshot, versions  # noqa: E402
 
 LOLBUILDS_VERSION = "1.3.2"
 
+# sources that can be imported on their own, sources made from other sources (e.g. consensus) are only imported with them
+STANDALONE_SOURCES = [source for source in SOURCES if len(source.inputs) == 0]
+
 
 def clear():
     """ Clears the terminal """
@@ -26,15 +34,9 @@ def print_script_info():
     print("#####################")
     print()
 
-    # check for new releases of LoLBuilds
-    versions.check_lolbuilds_version(LOLBUILDS_VERSION)
-
-    # compare local item set version to current source and LoL version to check if item sets are outdated
-    current_lol_version = versions.get_lol_version()
-    print(f"Current LoL version: {current_lol_version}")
-    print()
-    for source in SOURCES:
-        versions.check_source_version(source, current_lol_version)
+    # check for new releases of LoLBuilds and compare local item set version to current source and LoL version
+    # to check if item sets are outdated, all checks run at once and are reused for a few minutes
+    versions.check_versions(LOLBUILDS_VERSION, SOURCES)
     print()
 
 
@@ -87,6 +89,13 @@ def update_league_path():
 
 def main():
     """ Main program that deals with user input """
+    # pages fetched, skill orders shared and config values saved by other processes during the last run may be outdated by now
+    http.reset()
+    config.reload()
+    skills.reset()
+    ddragon.reset()
+    metrics.reset()
+
     clear()
     print_script_info()
 
@@ -96,12 +105,12 @@ def main():
     answer = None
 
     # only accept answers "", "d" (delete) or source name
-    while answer not in ["", "d"] + [source.name for source in SOURCES]:
+    while answer not in ["", "d"] + [source.name for source in STANDALONE_SOURCES]:
         print()
         print("-"*36, "USAGE", "-"*36)
         print("Import:")
         print("* To import item sets from all sources, press Enter")
-        for source in SOURCES:
+        for source in STANDALONE_SOURCES:
             print(
                 f"* To only import item sets from {source.name.capitalize()}, type '{source.name}' then press Enter")
         print()
@@ -138,29 +147,19 @@ def main():
                 source.delete_item_sets()
 
     # delete old item sets and import new ones from specified source
-    elif answer.lower() in [source.name for source in SOURCES]:
-        for source in SOURCES:
+    elif answer.lower() in [source.name for source in STANDALONE_SOURCES]:
+        for source in STANDALONE_SOURCES:
             if answer.lower() == source.name:
                 source.import_item_sets()
                 break
 
     # delete old item sets and import new ones from all sources
-    # uses multiprocessing to import from multiple sources at once
+    # the import from all sources is split into (source, champion, role) units that run concurrently
     else:
-        # for macos support
-        if sys.platform == "darwin":
-            multiprocessing.set_start_method("fork")
-
-        p = multiprocessing.Pool(processes=min(len(SOURCES), os.cpu_count()))
+        scheduler.run(SOURCES)
 
-        for source in SOURCES:
-            p.apply_async(source.import_item_sets)
-            # sleep to make sure config doesn't get accessed by more than one process at once
-            time.sleep(3)
-
-        # waits for all source imports to be done before continuing
-        p.close()
-        p.join()
+    # timings and counters of this run, for finding out where a slow import spends its time
+    print(f"\nSaved a performance report to {metrics.report()}")
 
     # last prompt before exiting the app
     print("\nDone!")
@@ -169,9 +168,91 @@ def main():
         answer = input("Press Enter to go back, or close this window if you want to exit")
 
 
+def parse_args(args):
+    """ Parses the command line arguments for running without prompts """
+    parser = argparse.ArgumentParser(
+        description="Imports or deletes item sets without any prompts, e.g. to run LoLBuilds from a scheduler. "
+        "Run without arguments for the interactive mode.")
+    parser.add_argument("--action", choices=["import", "delete"], default="import",
+                        help="import (default) or delete item sets")
+    parser.add_argument("--source", action="append", choices=[source.name for source in SOURCES],
+                        help="source to import from or delete, can be repeated (default: all sources)")
+    parser.add_argument("--path",
+                        help="League of Legends folder (default: the path saved by the interactive mode)")
+    snapshots = parser.add_mutually_exclusive_group()
+    snapshots.add_argument("--record", metavar="FILE",
+                           help="save every page the import fetches to a snapshot file")
+    snapshots.add_argument("--replay", metavar="FILE",
+                           help="import from the pages in a snapshot file instead of the sites, without sending any requests")
+    return parser.parse_args(args)
+
+
+def run_headless(args):
+    """ Runs a single import or delete without banner, version checks or prompts, returns the exit code """
+    args = parse_args(args)
+
+    if args.path is not None:
+        if not os.path.isdir(args.path):
+            print(f"ERROR: {args.path} is not a folder")
+            return 2
+        config.save("path", args.path)
+    elif config.get("path") is None:
+        print("ERROR: No League of Legends folder saved yet, use --path")
+        return 2
+
+    sources = [source for source in SOURCES
+               if args.source is None or source.name in args.source]
+
+    if args.action == "import":
+        for source in sources:
+            missing = [input_source.name for input_source in source.inputs
+                       if input_source not in sources]
+            if len(missing) > 0:
+                print(
+                    f"ERROR: {source.name} is made from the item sets of {', '.join(missing)}, import them at the same time")
+                return 2
+
+    failures = []
+    if args.action == "delete":
+        for source in sources:
+            source.delete_item_sets()
+    elif args.record is not None or args.replay is not None:
+        try:
+            if args.record is not None:
+                snapshot.start_recording(args.record)
+            else:
+                snapshot.start_replaying(args.replay)
+        except (OSError, snapshot.SnapshotError) as error:
+            print(f"ERROR: {error}")
+            return 2
+
+        try:
+            failures = scheduler.run(sources)
+        finally:
+            snapshot.stop()
+
+        counts = snapshot.stats()
+        if args.record is not None:
+            print(f"Recorded {counts['recorded']} pages to {args.record}")
+        else:
+            print(
+                f"Replayed {counts['replayed']} pages from {args.replay}, {counts['missing']} pages were not in the snapshot")
+    else:
+        failures = scheduler.run(sources)
+
+    first_request = http.stats()["first_request"]
+    if first_request is not None:
+        print(
+            f"Cold start: first request sent {1000 * (first_request - STARTED):.0f} ms after start")
+
+    print(f"Saved a performance report to {metrics.report()}")
+
+    return 1 if len(failures) > 0 else 0
+
+
 if __name__ == "__main__":
-    multiprocessing.freeze_support()
-    # the line above is needed for windows multiprocessing to work in the freezed lolbuilds.exe file
+    if len(sys.argv) > 1:
+        sys.exit(run_headless(sys.argv[1:]))
 
     while True:
         main()
@@ -5,10 +5,16 @@ from .source import Source
 from .championgg import Championgg
 from .probuilds import Probuilds
 from .opgg import Opgg
+from .consensus import Consensus
+
+_probuilds = Probuilds()
+_opgg = Opgg()
 
 SOURCES = [
     # temporarily disabled since championgg source needs an update to the new web site
     # Championgg(),
-    Probuilds(),
-    Opgg()
+    _probuilds,
+    _opgg,
+    # merges the item sets of the sources above, imported after them
+    Consensus([_probuilds, _opgg])
 ]
@@ -1,7 +1,5 @@
-import requests
-from bs4 import BeautifulSoup
-
 from sources import Source
+from utils import skills
 
 
 class Championgg(Source):
@@ -9,12 +7,11 @@ class Championgg(Source):
     def __init__(self):
         """ Implements champion.gg as a source """
         super().__init__("championgg")
+        self.shares_skill_orders = True
 
     def get_champions(self):
         """ Gets all champions with their roles from champion.gg """
-        body = requests.get("https://champion.gg/").text
-
-        soup = BeautifulSoup(body, "html.parser")
+        soup = self.get_soup("https://champion.gg/")
 
         champions = []
 
@@ -46,9 +43,8 @@ class Championgg(Source):
     def get_items(self, champion, role):
         """ Gets the item builds (most frequent and highest win %) for a champion and role from champion.gg """
 
-        body = requests.get(
-            "https://champion.gg/champion/" + champion["name"] + "/" + role).text
-        soup = BeautifulSoup(body, "html.parser")
+        soup = self.get_soup(
+            "https://champion.gg/champion/" + champion["name"] + "/" + role)
 
         items = {
             "frequent": {
@@ -87,9 +83,8 @@ class Championgg(Source):
     def get_skill_order(self, champion, role):
         """ Gets the recommended skill order from champion.gg """
 
-        body = requests.get(
-            "https://champion.gg/champion/" + champion["name"] + "/" + role).text
-        soup = BeautifulSoup(body, "html.parser")
+        soup = self.get_soup(
+            "https://champion.gg/champion/" + champion["name"] + "/" + role)
 
         skill_order = {
             "frequent": [],
@@ -103,30 +98,32 @@ class Championgg(Source):
             e = w.find_next_sibling("div", {"class": "skill"})
             r = e.find_next_sibling("div", {"class": "skill"})
 
-            skills = {
+            selections = {
                 "q": q,
                 "w": w,
                 "e": e,
                 "r": r
             }
 
-            for skill, div in skills.items():
-                skills[skill] = div.find(
+            for skill, div in selections.items():
+                selections[skill] = div.find(
                     "div", {"class": "skill-selections"}).find("div")
 
             for level in range(18):
-                for skill, div in skills.items():
+                for skill, div in selections.items():
                     if div.get("class") == ["selected"]:
                         skill_order["frequent" if counter ==
                                     0 else "highest"].append(skill)
-                        for skill, div in skills.items():
-                            skills[skill] = div.find_next_sibling("div")
+                        for skill, div in selections.items():
+                            selections[skill] = div.find_next_sibling("div")
                         break
 
+        skills.register(champion["name"], skill_order, self.version,
+                        champion["roles"].index(role))
+
         return skill_order
 
     def get_version(self):
         """ Get current champion.gg version """
-        body = requests.get("https://champion.gg/").text
-        soup = BeautifulSoup(body, "html.parser")
+        soup = self.get_soup("https://champion.gg/")
         return soup.find("strong").text
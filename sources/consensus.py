@@ -0,0 +1,175 @@
+import re
+import threading
+
+from sources import Source
+from utils import config, ddragon
+
+
+def _vote(builds):
+    """
+    Returns the items most builds agree on, as many as the longest build has,
+    in the order they are bought on average.
+
+    An item bought twice in a build (e.g. two potions) counts as two separate items.
+    """
+    # (item_id, n-th time it is bought) -> [builds it is in, sum of positions, first seen]
+    votes = {}
+    for build in builds:
+        bought = {}
+        for position, item_id in enumerate(build):
+            bought[item_id] = bought.get(item_id, 0) + 1
+            key = (item_id, bought[item_id])
+            if key not in votes:
+                votes[key] = [0, 0, len(votes)]
+            votes[key][0] += 1
+            votes[key][1] += position
+
+    length = max((len(build) for build in builds), default=0)
+    chosen = sorted(votes.items(), key=lambda e: (-e[1][0], e[1][2]))[:length]
+
+    # average position, ties in the order the items were first seen
+    chosen.sort(key=lambda e: (e[1][1] / e[1][0], e[1][2]))
+
+    return [item_id for (item_id, _), _ in chosen]
+
+
+def _pick(skill_orders):
+    """ Returns the skill order most sources agree on, the first one on ties """
+    counts = {}
+    for skill_order in skill_orders:
+        if len(skill_order) > 0:
+            counts[skill_order] = counts.get(skill_order, 0) + 1
+
+    return list(max(counts, key=counts.get)) if len(counts) > 0 else []
+
+
+class Consensus(Source):
+
+    def __init__(self, inputs):
+        """
+        Implements a source merging the item sets other sources import in the same run into one item set
+        per champion and role, without any requests.
+
+        utils.scheduler imports the inputs first and hands every item set to collect(),
+        then imports this source. Sources without roles count for every role of a champion.
+        Champions that failed on one of the inputs are not imported, so their old item sets are kept.
+
+        Parameters:
+        - inputs (list): sources to merge, champion names are taken from the first one that has the champion
+        """
+        super().__init__("consensus")
+        self.inputs = inputs
+
+        self._champions = {}
+        self._item_sets = {}
+        self._failed = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def collect(self, source, champion, item_set):
+        """ Keeps an item set imported by one of the inputs, called by utils.scheduler """
+        key = ddragon.get_champion_key(champion["name"])
+
+        with self._lock:
+            self._versions.setdefault(source.name, source.version)
+            self._champions.setdefault(key, {})[source.name] = champion
+            self._item_sets.setdefault(key, {}).setdefault(
+                source.name, {})[item_set.role] = item_set
+
+    def collect_failure(self, source, champion):
+        """ Remembers a champion one of the inputs couldn't import, called by utils.scheduler """
+        key = ddragon.get_champion_key(champion["name"])
+
+        with self._lock:
+            self._champions.setdefault(key, {})[source.name] = champion
+            self._item_sets.setdefault(key, {}).setdefault(source.name, {})
+            self._failed.setdefault(key, []).append(source.name)
+
+    def reset(self):
+        """ Forgets all collected item sets, called by utils.scheduler once this source is imported """
+        with self._lock:
+            self._champions.clear()
+            self._item_sets.clear()
+            self._failed.clear()
+            self._versions.clear()
+
+    def get_champions(self):
+        """
+        Gets the champions with at least one role from the collected item sets.
+
+        Champions that failed on an input are included with all their roles, and fail when they are imported.
+        """
+        champions = []
+
+        for key, champions_per_source in self._champions.items():
+            champion = None
+            roles = []
+
+            for source in self.inputs:
+                if source.name not in champions_per_source:
+                    continue
+                if champion is None:
+                    champion = champions_per_source[source.name].to_dict()
+                # roles in the order of the first source that has roles, if it has an item set for the role
+                item_sets = self._item_sets[key][source.name]
+                for role in champions_per_source[source.name].get("roles", []):
+                    if (role in item_sets or key in self._failed) and role not in roles:
+                        roles.append(role)
+
+            if len(roles) > 0 or key in self._failed:
+                champion["roles"] = roles
+                champions.append(champion)
+
+        return champions
+
+    def _get_item_sets(self, champion, role):
+        """ Returns the collected item sets of a champion for a role, from all inputs that have it """
+        key = ddragon.get_champion_key(champion["name"])
+        if key in self._failed:
+            raise LookupError(
+                f"{champion['display_name']} could not be imported from {', '.join(self._failed[key])}, keeping the old item sets")
+
+        item_sets = self._item_sets.get(key, {})
+
+        # sources without roles have a single item set for all roles
+        return [item_sets[source.name].get(role, item_sets[source.name].get(None))
+                for source in self.inputs
+                if source.name in item_sets and (role in item_sets[source.name] or None in item_sets[source.name])]
+
+    def get_items(self, champion, role):
+        """ Merges the builds of all inputs for a champion and role, items most builds have come first """
+        item_sets = self._get_item_sets(champion, role)
+
+        if len(item_sets) == 0:
+            raise LookupError(
+                f"No item sets for {champion['display_name']} {role} from {', '.join(source.name for source in self.inputs)}")
+
+        items = {}
+        for build in ["frequent", "highest"]:
+            items[build] = {
+                "full": _vote([getattr(item_set, build).full for item_set in item_sets]),
+                "starters": _vote([getattr(item_set, build).starters for item_set in item_sets])
+            }
+
+        return items
+
+    def get_skill_order(self, champion, role):
+        """ Picks the skill order most inputs agree on for a champion and role """
+        item_sets = self._get_item_sets(champion, role)
+
+        return {
+            "frequent": _pick([item_set.frequent.skill_order for item_set in item_sets]),
+            "highest": _pick([item_set.highest.skill_order for item_set in item_sets])
+        }
+
+    def get_version(self):
+        """ Returns the patch of the inputs, from the collected item sets or the versions saved by the last import """
+        versions = [self._versions.get(source.name) or config.get(source.name)
+                    for source in self.inputs]
+
+        # op.gg has patch numbers, probuilds dates
+        for version in versions:
+            if version is not None and re.match(r"^\d+\.\d+$", version):
+                return version
+
+        return next((version for version in versions if version is not None), None)
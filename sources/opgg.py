@@ -1,7 +1,95 @@
-import requests
-from bs4 import BeautifulSoup
-
 from sources import Source
+from utils import config, ddragon, parsing, skills
+
+# the parts of the item and skill pages that are read, everything else is skipped when parsing
+ITEM_TABLES = parsing.strainer("table", "champion-stats__table")
+SKILL_TABLE = parsing.strainer("table", "champion-stats__table--skill")
+
+
+# regions builds are merged from, can be overridden with "opgg_regions" in the config.
+# The champion list and version come from the first region
+DEFAULT_REGIONS = ["euw", "na", "kr"]
+
+# regions that are not served from <region>.op.gg
+REGION_HOSTS = {
+    "kr": "www.op.gg"
+}
+
+
+def _get_regions():
+    regions = config.get("opgg_regions", DEFAULT_REGIONS)
+    return DEFAULT_REGIONS if len(regions) == 0 else regions
+
+
+def _get_host(region):
+    return REGION_HOSTS.get(region, f"{region}.op.gg")
+
+
+def _get_rates(row):
+    """
+    Returns (pick_rate, win_rate, games) of a table row, in percent and number of games.
+    games is None if the row doesn't show how many games it is based on.
+    """
+    pick_rate_td = row.find(
+        "td", {"class": "champion-stats__table__cell--pickrate"})
+    pick_rate = float(pick_rate_td.text.strip().split("%")[0])
+    win_rate = float(row.find("td", {
+                     "class": "champion-stats__table__cell--winrate"}).text.strip().split("%")[0])
+
+    # the number of games is shown below the pick rate
+    games = pick_rate_td.find("em")
+    games = games.text.strip().replace(",", "") if games is not None else ""
+    games = int(games) if games.isdigit() else None
+
+    return pick_rate, win_rate, games
+
+
+def _merge(regions):
+    """
+    Merges the rows of the same table from several regions into (value, pick_rate, win_rate) rows,
+    in the order the values first appear.
+
+    The pick rate of a value is weighted by the number of games played in each region, a region where
+    it wasn't picked counts as 0%. The win rate is weighted by the number of games the value was picked in.
+    Regions without game counts count as the same size.
+    """
+    # estimated number of games the pick rates of each region are based on
+    region_games = []
+    for rows in regions:
+        totals = [games / pick_rate * 100 for _, pick_rate, _, games in rows
+                  if games is not None and pick_rate > 0]
+        region_games.append(sum(totals) / len(totals)
+                            if len(totals) == len(rows) and len(totals) > 0 else 100)
+
+    total_games = sum(region_games)
+
+    merged = {}
+    for rows, games_played in zip(regions, region_games):
+        # a value listed twice in a region is kept as two rows
+        seen = {}
+        for value, pick_rate, win_rate, games in rows:
+            key = tuple(value) if isinstance(value, list) else value
+            seen[key] = seen.get(key, 0) + 1
+            key = (key, seen[key])
+            if key not in merged:
+                merged[key] = (value, [])
+            merged[key][1].append(
+                (pick_rate, win_rate, games if games is not None else pick_rate * games_played / 100, games_played))
+
+    result = []
+    for value, rates in merged.values():
+        # a value from a single region keeps its rates
+        if len(regions) == 1:
+            pick_rate, win_rate = rates[0][0], rates[0][1]
+        else:
+            pick_rate = sum(pick_rate * games_played for pick_rate, _, _,
+                            games_played in rates) / total_games
+            picked = sum(games for _, _, games, _ in rates)
+            win_rate = sum(win_rate * games for _, win_rate, games, _ in rates) / picked \
+                if picked > 0 else rates[0][1]
+        result.append((value, pick_rate, win_rate))
+
+    return result
 
 
 class Opgg(Source):
@@ -9,10 +97,11 @@ class Opgg(Source):
     def __init__(self):
         """ Implements op.gg as a source """
         super().__init__("opgg")
+        self.shares_skill_orders = True
 
     def get_champions(self):
-        html = requests.get("https://euw.op.gg/champion/statistics").text
-        soup = BeautifulSoup(html, "html.parser")
+        soup = self.get_soup(
+            f"https://{_get_host(_get_regions()[0])}/champion/statistics")
         all_champion_divs = soup.find(
             "div", {"class": "champion-index__champion-list"}).find_all("div", {"class": "champion-index__champion-item"})
 
@@ -49,10 +138,10 @@ class Opgg(Source):
 
         return champions
 
-    def get_items(self, champion, role):
-        html = requests.get(
-            f"https://euw.op.gg/champion/{champion['name']}/statistics/{role.lower()}/item").text
-        soup = BeautifulSoup(html, "html.parser")
+    def _get_item_tables(self, champion, role, region):
+        """ Returns the core build, boots and starters rows of a region, see _get_rates """
+        soup = self.get_soup(
+            f"https://{_get_host(region)}/champion/{champion['name']}/statistics/{role.lower()}/item", ITEM_TABLES)
 
         tables = soup.find_all("table", {"class": "champion-stats__table"})
 
@@ -63,38 +152,16 @@ class Opgg(Source):
             items_td = row.find(
                 "td", {"class": "champion-stats__table__cell--data"})
             for item in items_td.find_all("li", {"class": "champion-stats__list__item"}):
-                items.append(item.find("img").get("src").split("item")[1][1:5])
-            pick_rate = float(row.find("td", {
-                              "class": "champion-stats__table__cell--pickrate"}).text.strip().split("%")[0])
-            win_rate = float(row.find("td", {
-                             "class": "champion-stats__table__cell--winrate"}).text.strip().split("%")[0])
-            core_builds.append((items, pick_rate, win_rate))
-
-        # choose core build with highest pick rate
-        frequent_core = sorted(
-            core_builds, key=lambda e: e[1], reverse=True)[0][0]
-
-        # choose core build with highest win rate
-        highest_core = sorted(
-            core_builds, key=lambda e: e[2], reverse=True)[0][0]
+                items.append(ddragon.get_item_id(item.find("img").get("src")))
+            core_builds.append((items, *_get_rates(row)))
 
         boots = []
         boots_rows = tables[1].find_all("tr")[1:]
         for row in boots_rows:
             item_div = row.find(
                 "div", {"class": "champion-stats__single__item"})
-            boots_id = item_div.find("img").get("src").split("item")[1][1:5]
-            pick_rate = float(row.find("td", {
-                              "class": "champion-stats__table__cell--pickrate"}).text.strip().split("%")[0])
-            win_rate = float(row.find("td", {
-                             "class": "champion-stats__table__cell--winrate"}).text.strip().split("%")[0])
-            boots.append((boots_id, pick_rate, win_rate))
-
-        # add boots to frequent and highest win rate build
-        frequent_core.append(
-            sorted(boots, key=lambda e: e[1], reverse=True)[0][0])
-        highest_core.append(
-            sorted(boots, key=lambda e: e[2], reverse=True)[0][0])
+            boots_id = ddragon.get_item_id(item_div.find("img").get("src"))
+            boots.append((boots_id, *_get_rates(row)))
 
         starters = []
         starters_rows = tables[2].find_all("tr")[1:]
@@ -103,17 +170,32 @@ class Opgg(Source):
             items_td = row.find(
                 "td", {"class": "champion-stats__table__cell--data"})
             for item in items_td.find_all("li", {"class": "champion-stats__list__item"}):
-                items.append(item.find("img").get("src").split("item")[1][1:5])
-            pick_rate = float(row.find("td", {
-                              "class": "champion-stats__table__cell--pickrate"}).text.strip().split("%")[0])
-            win_rate = float(row.find("td", {
-                             "class": "champion-stats__table__cell--winrate"}).text.strip().split("%")[0])
-            starters.append((items, pick_rate, win_rate))
-
-        frequent_starters = sorted(
-            starters, key=lambda e: e[1], reverse=True)[0][0]
-        highest_starters = sorted(
-            starters, key=lambda e: e[2], reverse=True)[0][0]
+                items.append(ddragon.get_item_id(item.find("img").get("src")))
+            starters.append((items, *_get_rates(row)))
+
+        return core_builds, boots, starters
+
+    def get_items(self, champion, role):
+        # the tables of all regions are fetched at the same time and merged
+        regions = self.get_all(lambda region: self._get_item_tables(champion, role, region),
+                               _get_regions(), f"{champion['display_name']}'s {role} items")
+
+        core_builds = _merge([tables[0] for tables in regions])
+        boots = _merge([tables[1] for tables in regions])
+        starters = _merge([tables[2] for tables in regions])
+
+        # choose core build with highest pick rate
+        frequent_core = list(max(core_builds, key=lambda e: e[1])[0])
+
+        # choose core build with highest win rate
+        highest_core = list(max(core_builds, key=lambda e: e[2])[0])
+
+        # add boots to frequent and highest win rate build
+        frequent_core.append(max(boots, key=lambda e: e[1])[0])
+        highest_core.append(max(boots, key=lambda e: e[2])[0])
+
+        frequent_starters = list(max(starters, key=lambda e: e[1])[0])
+        highest_starters = list(max(starters, key=lambda e: e[2])[0])
 
         items = {
             "frequent": {
@@ -128,10 +210,10 @@ class Opgg(Source):
 
         return items
 
-    def get_skill_order(self, champion, role):
-        html = requests.get(
-            f"https://euw.op.gg/champion/{champion['name']}/statistics/{role.lower()}/skill").text
-        soup = BeautifulSoup(html, "html.parser")
+    def _get_skill_rows(self, champion, role, region):
+        """ Returns the skill order rows of a region, see _get_rates """
+        soup = self.get_soup(
+            f"https://{_get_host(region)}/champion/{champion['name']}/statistics/{role.lower()}/skill", SKILL_TABLE)
 
         rows = soup.find(
             "table", {"class": "champion-stats__table--skill"}).find("tbody").children
@@ -145,37 +227,42 @@ class Opgg(Source):
                     "td", {"class": "champion-stats__table__cell--data"}).find("table")
                 skills_row = skill_table.find_all("tr")[1]
 
-                skills = []
+                levels = []
 
                 for skill_td in skills_row:
 
                     # need try/except because page loads pictures in some places
                     try:
                         skill = skill_td.text.strip()
-                        skills.append(skill)
+                        levels.append(skill)
                     except:
                         pass
 
-                pick_rate = float(row.find("td", {
-                    "class": "champion-stats__table__cell--pickrate"}).text.strip().split("%")[0])
-                win_rate = float(row.find("td", {
-                    "class": "champion-stats__table__cell--winrate"}).text.strip().split("%")[0])
-
-                skill_orders.append((skills, pick_rate, win_rate))
+                skill_orders.append((levels, *_get_rates(row)))
 
             except:
                 pass
 
+        return skill_orders
+
+    def get_skill_order(self, champion, role):
+        skill_orders = _merge(self.get_all(lambda region: self._get_skill_rows(champion, role, region),
+                                           _get_regions(), f"{champion['display_name']}'s {role} skill order"))
+
         skill_order = {
-            "frequent": sorted(skill_orders, key=lambda e: e[1], reverse=True)[0][0],
-            "highest": sorted(skill_orders, key=lambda e: e[2], reverse=True)[0][0]
+            "frequent": list(max(skill_orders, key=lambda e: e[1])[0]),
+            "highest": list(max(skill_orders, key=lambda e: e[2])[0])
         }
 
+        # sources without skill orders of their own use this one, the main role is preferred
+        skills.register(champion["name"], skill_order, self.version,
+                        champion["roles"].index(role))
+
         return skill_order
 
     def get_version(self):
-        html = requests.get("https://euw.op.gg/champion/statistics").text
-        soup = BeautifulSoup(html, "html.parser")
+        soup = self.get_soup(
+            f"https://{_get_host(_get_regions()[0])}/champion/statistics")
         version = soup.find(
             "div", {"class": "champion-index__version"}).text.strip().split(" ")[-1]
         return version
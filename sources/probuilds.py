@@ -1,9 +1,119 @@
+import heapq
+import re
 from datetime import date
 
-import requests
-from bs4 import BeautifulSoup
-
 from sources import Source
+from utils import ddragon, parsing, skills
+
+# the part of the champion details page with the most frequent build
+POPULAR_SECTION = parsing.strainer("div", "popular-section")
+
+# tags and the attributes read from match fragments
+TAG_PATTERN = re.compile(r"<(/?)([a-zA-Z][a-zA-Z0-9]*)([^>]*)>")
+CLASS_PATTERN = re.compile(r"""(?<![\w-])class\s*=\s*["']([^"']*)["']""")
+DATA_ID_PATTERN = re.compile(r"""(?<![\w-])data-id\s*=\s*["']([^"']*)["']""")
+
+# the span with the kills, deaths and assists of a match
+KDA_SPANS = {"green": "kills", "red": "deaths", "gold": "assists"}
+
+
+def _get_kda(kills, deaths, assists):
+    return (kills + assists) / (1 if deaths == 0 else deaths)
+
+
+def _get_attribute(attributes, pattern, name):
+    """ Returns the value of a quoted attribute, None if it is missing, raises ValueError if it can't be read """
+    found = pattern.search(attributes)
+    if found is None:
+        if name in attributes:
+            raise ValueError(f"Unexpected {name} attribute")
+        return None
+    return found.group(1)
+
+
+def _get_classes(attributes):
+    classes = _get_attribute(attributes, CLASS_PATTERN, "class")
+    return classes.split() if classes is not None else []
+
+
+def _extract_match(match):
+    """
+    Gets (build, kda) from a match fragment by scanning its tags once instead of building a soup.
+    Raises ValueError if the fragment doesn't look as expected.
+    """
+    kda = {}
+    build = []
+
+    # div depth, and the depth of the kda and items divs while inside them
+    depth = 0
+    kda_depth = None
+    items_depth = None
+    found_items = False
+
+    for tag in TAG_PATTERN.finditer(match):
+        closing, name, attributes = tag.groups()
+        name = name.lower()
+
+        if name == "div":
+            if closing:
+                if depth == kda_depth:
+                    kda_depth = None
+                if depth == items_depth:
+                    items_depth = None
+                depth -= 1
+            elif not attributes.endswith("/"):
+                depth += 1
+                classes = _get_classes(attributes)
+                if "kda" in classes and kda_depth is None and len(kda) == 0:
+                    kda_depth = depth
+                if "items" in classes and not found_items:
+                    items_depth = depth
+                    found_items = True
+
+        elif closing:
+            continue
+
+        elif name == "span" and kda_depth is not None:
+            for class_ in _get_classes(attributes):
+                if class_ in KDA_SPANS and KDA_SPANS[class_] not in kda:
+                    # the number is the text right after the opening tag
+                    end = match.find("<", tag.end())
+                    kda[KDA_SPANS[class_]] = int(
+                        match[tag.end():end if end != -1 else len(match)])
+                    break
+
+        elif name == "img" and items_depth is not None:
+            if "tooltip" in _get_classes(attributes):
+                build.append(_get_attribute(
+                    attributes, DATA_ID_PATTERN, "data-id"))
+
+    if len(kda) != len(KDA_SPANS) or not found_items:
+        raise ValueError("Unexpected match fragment")
+
+    # remove trinket from build
+    return build[:-1], _get_kda(**kda)
+
+
+def _parse_match(match):
+    """ Gets (build, kda) from a match fragment with a full parse, used when _extract_match fails """
+    match_soup = parsing.parse(match)
+
+    kda_div = match_soup.find("div", {"class": "kda"})
+    kills = int(kda_div.find("span", {"class": "green"}).contents[0])
+    deaths = int(kda_div.find("span", {"class": "red"}).contents[0])
+    assists = int(kda_div.find("span", {"class": "gold"}).contents[0])
+
+    build_div = match_soup.find("div", {"class": "items"})
+
+    # remove trinket from build
+    item_divs = build_div.find_all("img", {"class": "tooltip"})[:-1]
+
+    build = []
+
+    for item_div in item_divs:
+        build.append(item_div.get("data-id"))
+
+    return build, _get_kda(kills, deaths, assists)
 
 
 class Probuilds(Source):
@@ -11,14 +121,13 @@ class Probuilds(Source):
     def __init__(self):
         """ Implements probuilds.net as a source """
         super().__init__("probuilds", False)
+        self.uses_skill_orders = True
 
     def get_champions(self):
         """ Gets all champions from probuilds.net """
 
-        response = requests.get(
-            "https://www.probuilds.net/ajax/championListNew")
-
-        response = response.json()["champions"]
+        response = self.get_json(
+            "https://www.probuilds.net/ajax/championListNew")["champions"]
 
         champions = []
 
@@ -34,6 +143,20 @@ class Probuilds(Source):
 
         return champions
 
+    def get_best_build(self, matches):
+        """ Returns the build of the match with the highest KDA (the first one on ties), or None if there are no matches """
+
+        def builds():
+            for match in matches:
+                try:
+                    yield _extract_match(match)
+                except ValueError:
+                    yield _parse_match(match)
+
+        best = heapq.nlargest(1, builds(), key=lambda build: build[1])
+
+        return best[0][0] if len(best) > 0 else None
+
     def get_items(self, champion):
         """ Gets the item builds (most frequent and highest win %) for a champion from probuilds """
 
@@ -49,51 +172,25 @@ class Probuilds(Source):
         }
 
         # get highest KDA winning build
-        response = requests.get(
+        response = self.get_json(
             f"https://www.probuilds.net/ajax/champBuilds?championId={champion['id']}")
 
-        response = response.json()
-
         matches = response["matches"]
         build_order = response["buildOrder"]
 
-        builds = []
-
-        for match in matches:
-
-            match_soup = BeautifulSoup(match, "html.parser")
-
-            kda_div = match_soup.find("div", {"class": "kda"})
-            kills = int(kda_div.find("span", {"class": "green"}).contents[0])
-            deaths = int(kda_div.find("span", {"class": "red"}).contents[0])
-            assists = int(kda_div.find("span", {"class": "gold"}).contents[0])
-
-            kda = (kills + assists) / (1 if deaths == 0 else deaths)
-
-            build_div = match_soup.find("div", {"class": "items"})
-
-            # remove trinket from build
-            item_divs = build_div.find_all("img", {"class": "tooltip"})[:-1]
-
-            build = []
-
-            for item_div in item_divs:
-                build.append(item_div.get("data-id"))
-
-            builds.append((build, kda))
-
-        # sort by KDA
-        builds.sort(key=lambda match: match[1], reverse=True)
+        # all match fragments are scanned in one pass, only the highest KDA build is kept
+        best = self.get_best_build(matches)
 
         # not enough data for build
-        try:
-            items["highest"]["full"] = builds[0][0]
-        except IndexError:
+        if best is not None:
+            items["highest"]["full"] = best
+        else:
             print(
                 f"NOT FOUND: Highest win % build for {champion['display_name']} not found on probuilds.net")
 
         # getting starter items
-        build_order_soup = BeautifulSoup(build_order, "html.parser")
+        # the starter items are found by position, which relies on how html.parser builds the tree
+        build_order_soup = parsing.parse(build_order, backend="html.parser")
         build_order_items = build_order_soup.find(
             "div", {"class": "build-list"})
 
@@ -107,7 +204,7 @@ class Probuilds(Source):
                 data_id = starter_item.get("data-id")
 
                 # don't include None and trinkets in starter items
-                if data_id is not None and data_id != "3340":
+                if data_id is not None and not ddragon.is_trinket(data_id):
                     items["highest"]["starters"].append(data_id)
 
             items["frequent"]["starters"] = items["highest"]["starters"]
@@ -116,11 +213,8 @@ class Probuilds(Source):
                 f"NOT FOUND: Starter items for {champion['display_name']} not found on probuilds.net")
 
         # get frequent build
-        response = requests.get(
-            f"https://www.probuilds.net/champions/details/{champion['id']}")
-        html = response.text
-
-        frequent_soup = BeautifulSoup(html, "html.parser")
+        frequent_soup = self.get_soup(
+            f"https://www.probuilds.net/champions/details/{champion['id']}", POPULAR_SECTION)
 
         frequent_items_div = frequent_soup.find(
             "div", {"class": "popular-section"})
@@ -137,12 +231,18 @@ class Probuilds(Source):
         return items
 
     def get_skill_order(self, champion):
-        """ Gets the recommended skill order from champion.gg """
+        """
+        Gets the skill order shared by another source in this run or saved by an earlier run (see utils.skills),
+        and only downloads it from champion.gg if neither has it
+        """
         # TODO: Parse skill order from probuilds
+        return skills.get(champion["name"], lambda: self.get_championgg_skill_order(champion))
+
+    def get_championgg_skill_order(self, champion):
+        """ Gets the recommended skill order from champion.gg """
 
-        body = requests.get(
-            "https://champion.gg/champion/" + champion["name"]).text
-        soup = BeautifulSoup(body, "html.parser")
+        soup = self.get_soup(
+            "https://champion.gg/champion/" + champion["name"])
 
         skill_order = {
             "frequent": [],
@@ -1,4 +1,31 @@
-from utils import config, files
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import config, files, http, manifest, metrics, parsing, records, scheduler
+
+# threads fetching the pages (items and skill order) of a role at the same time
+PAGE_WORKERS = 16
+
+# threads getting the variants of a page at the same time, e.g. the same op.gg page from several regions, see Source.get_all
+VARIANT_WORKERS = 16
+
+# threads parsing downloaded pages, can be overridden with "parse_workers" in the config.
+# Parsing holds the GIL, so more threads don't parse faster, but every page being parsed at once takes memory
+DEFAULT_PARSE_WORKERS = 2
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def _get_executor(name, max_workers):
+    """ Returns a thread pool shared by all sources, e.g. for pages or parsing, created the first time it is needed """
+    with _executors_lock:
+        if name not in _executors:
+            _executors[name] = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix=f"lolbuilds-{name}")
+        return _executors[name]
 
 
 class Source:
@@ -15,6 +42,17 @@ class Source:
         self.name = name
         self.roles = roles
 
+        # version of the source being imported, used to key cached pages
+        self.version = None
+
+        # sources whose item sets this source is made from, see sources.Consensus and utils.scheduler
+        self.inputs = []
+
+        # sources that register the skill orders they fetch with utils.skills, and sources that use them.
+        # utils.scheduler imports a champion from the sources using skill orders after the ones sharing them
+        self.shares_skill_orders = False
+        self.uses_skill_orders = False
+
     def get_champions(self):
         """
         - Returns a list of champions in dictonary format
@@ -77,99 +115,152 @@ class Source:
         """
         raise NotImplementedError
 
-    def get_item_sets(self, champion):
-        """ Gets item sets with items and skill order for every role (if supported) for a champion """
-
-        item_sets = []
-
-        # roles supported, create an item set per role
-        if self.roles:
-            for counter, role in enumerate(champion["roles"]):
-                try:
-                    items = self.get_items(champion, role)
-                    skill_order = self.get_skill_order(champion, role)
-
-                    item_set = {
-                        "role": role,
-                        # add sort_rank if roles are supported, higher sort rank equals higher position in the item set list in-game
-                        "sort_rank": 10 - counter,
-                        "frequent": {
-                            "full": items["frequent"]["full"],
-                            "starters": items["frequent"]["starters"],
-                            "skill_order": skill_order["frequent"]
-                        },
-                        "highest": {
-                            "full": items["highest"]["full"],
-                            "starters": items["highest"]["starters"],
-                            "skill_order": skill_order["highest"]
-                        }
-                    }
+    def get_text(self, url):
+        """ Fetches a page through the shared connection pool and cache and returns its body as text """
+        with metrics.timer(self.name, "fetch"):
+            body, encoding = http.fetch(url, self.version)
+        metrics.add(self.name, "bytes_fetched", len(body))
+        return http.decode(body, encoding)
 
-                    item_sets.append(item_set)
-                except:
-                    print(
-                        f"ERROR: Build for {champion['display_name']} {role} not found on {self.name}")
+    def get_json(self, url):
+        """ Fetches a page through the shared connection pool and cache and returns its body parsed as json """
+        return json.loads(self.get_text(url))
 
-        # roles not supported, create only one item set
-        else:
-            try:
-                items = self.get_items(champion)
-                skill_order = self.get_skill_order(champion)
+    def get_soup(self, url, only=None):
+        """
+        Fetches and parses a page, returning a BeautifulSoup object.
 
-                item_set = {
-                    "frequent": {
-                        "full": items["frequent"]["full"],
-                        "starters": items["frequent"]["starters"],
-                        "skill_order": skill_order["frequent"]
-                    },
-                    "highest": {
-                        "full": items["highest"]["full"],
-                        "starters": items["highest"]["starters"],
-                        "skill_order": skill_order["highest"]
-                    }
-                }
+        The parsed page is shared for the rest of the run, so methods reading the same page
+        (e.g. get_items and get_skill_order) only download and parse it once.
+        Pages are parsed by a few shared parser threads, see DEFAULT_PARSE_WORKERS.
 
-                item_sets.append(item_set)
+        Parameters:
+        - url (str): page to fetch
+        - only (tuple): value from utils.parsing.strainer(), to only parse the part of the page that is used
+        """
+        def parse(html, queued):
+            # time the page waited for a parser, high when pages are downloaded faster than they can be parsed
+            metrics.record("pipeline", "parse_blocked",
+                           time.perf_counter() - queued)
+            with metrics.timer(self.name, "parse"):
+                return parsing.parse(html, only)
+
+        def fetch():
+            html = self.get_text(url)
+            parse_workers = config.get("parse_workers", DEFAULT_PARSE_WORKERS)
+            parsers = _get_executor("parse", max(parse_workers, 1))
+            return parsers.submit(parse, html, time.perf_counter()).result()
+
+        return http.memoize(("soup", url, only), fetch)
+
+    def get_all(self, function, values, description):
+        """
+        Calls function(value) for all values at the same time, e.g. to fetch the same page from several regions.
 
-            except:
-                print(
-                    f"ERROR: Build for {champion['display_name']} not found on {self.name}")
+        Returns the results of the calls that succeeded in the order of values, the values that failed are left out
+        and reported with what they were getting, e.g. "Ahri's Mid items", raises the error of the first call if all of them failed.
+        """
+        if len(values) == 1:
+            return [function(values[0])]
 
-        return item_sets
+        variants = _get_executor("variants", VARIANT_WORKERS)
+        futures = [variants.submit(function, value) for value in values]
 
-    def import_item_sets(self):
-        """ Imports all item sets for all champions and roles """
+        results = []
+        errors = []
+        for value, future in zip(values, futures):
+            try:
+                results.append(future.result())
+            except Exception as error:
+                errors.append((value, error))
 
-        # first remove old item sets
-        self.delete_item_sets()
+        if len(results) == 0:
+            raise errors[0][1]
 
-        champions = self.get_champions()
-        version = self.get_version()
+        for value, error in errors:
+            print(
+                f"ERROR: Could not get {description} from {self.name} ({value}), using the others: {error}")
 
-        config.save(self.name, version)
+        return results
 
-        for champion in champions:
-            print(
-                f"Importing {champion['display_name']}'s item sets from {self.name}...")
+    def get_item_set(self, champion, role=None, sort_rank=None):
+        """
+        Gets an item set with items and skill order for a champion and role (if supported).
+        Raises an exception if the build is not found.
 
-            item_sets = self.get_item_sets(champion)
+        Parameters:
+        - champion (dict): dict returned from get_champions
+        - OPTIONAL: role (str): role to get the item set for, if self.roles == True
+        - OPTIONAL: sort_rank (int): position in the item set list in-game, if self.roles == True
 
-            for item_set in item_sets:
-                files.save(champion, item_set, version, self.name, self.roles)
+        Returns a utils.records.ItemSet.
+        """
+        # roles supported, get items and skill order for the role
+        args = (champion, role) if self.roles else (champion,)
+
+        def get_items():
+            with metrics.timer(self.name, "get_items"):
+                return self.get_items(*args)
+
+        def get_skill_order():
+            with metrics.timer(self.name, "get_skill_order"):
+                return self.get_skill_order(*args)
+
+        # items and skill order are fetched at the same time, pages they share are only fetched once (see get_soup)
+        with metrics.timer(self.name, "get_item_set"):
+            pages = _get_executor("pages", PAGE_WORKERS)
+            items = pages.submit(get_items)
+            skill_order = get_skill_order()
+            items = items.result()
+
+        # item ids are kept as ints in arrays from here on, see utils.records
+        item_set = records.ItemSet(
+            records.Build.from_source(
+                items["frequent"], skill_order["frequent"]),
+            records.Build.from_source(
+                items["highest"], skill_order["highest"]),
+            # role and sort_rank if roles are supported, higher sort rank equals higher position in the item set list in-game
+            role if self.roles else None,
+            sort_rank if self.roles else None)
+
+        return item_set
+
+    async def get_item_set_async(self, champion, role=None, sort_rank=None):
+        """
+        Asynchronous version of get_item_set used by utils.scheduler.
+
+        Sources can override this with a native asyncio implementation. By default the blocking
+        get_item_set runs in the executor of the event loop, so get_items and get_skill_order keep working unchanged.
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.get_item_set, champion, role, sort_rank)
+
+    def import_item_sets(self):
+        """
+        Imports all item sets for all champions and roles.
+
+        Returns a list of failures, see utils.scheduler.run.
+        """
+        return scheduler.run([self])
 
     def delete_item_sets(self):
         """ Deletes all item sets for all champions and roles generated by import_item_sets """
 
         print(f"Deleting item sets from {self.name}")
 
-        config.save(self.name, None)
+        # the manifest lists every item set written by this source, so no network access is needed
+        if manifest.exists(self.name):
+            item_sets = [manifest.split_key(key)
+                         for key in manifest.load(self.name)]
+        else:
+            # item sets imported before manifests were kept
+            item_sets = files.find(self.name)
 
-        try:
-            champions = self.get_champions()
-        except:
-            print(
-                f"ERROR: Could not get the champion list from {self.name}. This likely happened because of a bad connection to {self.name}, or because {self.name} changed something on their site.")
-            return
+        with metrics.timer(self.name, "delete"):
+            for champion_name, file_name in item_sets:
+                files.remove(champion_name, file_name)
 
-        for champion in champions:
-            files.delete(champion, self.name)
+        config.save(self.name, None)
+        manifest.save(self.name, {})
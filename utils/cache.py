@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from utils import config, files
+
+# seconds a cached page is used without asking the server, can be overridden with "cache_ttl" in the config
+DEFAULT_TTL = 12 * 60 * 60
+
+# max total size of the cache in MB, can be overridden with "cache_size" in the config
+DEFAULT_SIZE = 200
+
+# evict old entries after this many new entries have been stored
+EVICT_INTERVAL = 50
+
+_stores = 0
+_stores_lock = threading.Lock()
+
+
+def _get_path(url, version):
+    """ Returns the file path of the cache entry for url at a given source version """
+    key = hashlib.sha1(f"{version}|{url}".encode("utf-8")).hexdigest()
+    return os.path.join(config.get_directory("cache"), f"{key}.cache")
+
+
+def load(url, version=None):
+    """
+    Returns the cached entry for url as a (metadata, body) tuple, or None if it isn't cached.
+
+    metadata is a dict with "url", "version", "encoding", "etag", "last_modified" and "stored" (unix time).
+    """
+    path = _get_path(url, version)
+
+    try:
+        with open(path, "rb") as f:
+            metadata = json.loads(f.readline())
+            body = f.read()
+    except (OSError, ValueError):
+        # missing, evicted by another process while reading, or a corrupt entry
+        return None
+
+    # mark the entry as recently used for LRU eviction
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+    return metadata, body
+
+
+def is_fresh(metadata):
+    """ Returns True if the entry can be used without revalidating it with the server """
+    return time.time() - metadata["stored"] < config.get("cache_ttl", DEFAULT_TTL)
+
+
+def store(url, version, body, encoding=None, etag=None, last_modified=None):
+    """ Stores a response body in the cache """
+    global _stores
+
+    metadata = {
+        "url": url,
+        "version": version,
+        "encoding": encoding,
+        "etag": etag,
+        "last_modified": last_modified,
+        "stored": time.time()
+    }
+
+    path = _get_path(url, version)
+
+    # written atomically so other processes never see a half-written entry
+    try:
+        files.write_atomic(path, json.dumps(metadata).encode(
+            "utf-8") + b"\n" + body, skip_unchanged=False)
+    except OSError:
+        return
+
+    with _stores_lock:
+        _stores += 1
+        evict_now = _stores % EVICT_INTERVAL == 0
+
+    if evict_now:
+        evict()
+
+
+def evict():
+    """ Deletes the least recently used entries until the cache is within its size limit """
+    max_size = config.get("cache_size", DEFAULT_SIZE) * 1024 * 1024
+    directory = config.get_directory("cache")
+
+    entries = []
+    total_size = 0
+    for entry in os.scandir(directory):
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total_size += stat.st_size
+
+    # oldest first
+    entries.sort()
+    for _, size, path in entries:
+        if total_size <= max_size:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            # already removed by another process, or in use on Windows
+            continue
+        total_size -= size
@@ -1,43 +1,99 @@
 import json
 import os
+import threading
+from contextlib import contextmanager
 
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
 
-def get(key):
-    """ Get value from key in config """
-    home_path = os.path.expanduser("~")
+# config is read from disk once and kept in memory, see reload()
+_config = None
+_config_lock = threading.Lock()
 
-    # if config is made
-    if os.path.isfile(os.path.join(home_path, ".lolbuilds", "config.json")):
-        with open(os.path.join(home_path, ".lolbuilds", "config.json")) as f:
-            config = json.load(f)
 
-        if key in config:
-            return config[key]
+def get_directory(*paths):
+    """ Returns the path to a folder inside ~/.lolbuilds, creating it if it doesn't exist """
+    directory = os.path.join(os.path.expanduser("~"), ".lolbuilds", *paths)
+    os.makedirs(directory, exist_ok=True)
+    return directory
 
-    # config is not made or config does not contain key
-    return None
+
+def _get_config_path():
+    return os.path.join(get_directory(), "config.json")
+
+
+@contextmanager
+def _lock_file():
+    """ Locks the config across processes, so a save from one process never overwrites a save from another """
+    with open(os.path.join(get_directory(), "config.json.lock"), "a+") as f:
+        if os.name == "nt":
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after 10 seconds, keep waiting
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _read():
+    """ Reads the config file, returns an empty config if it isn't made yet """
+    try:
+        with open(_get_config_path()) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write(config):
+    """ Writes the config atomically, so readers never see a half-written config """
+    # utils.files imports this module
+    from utils import files
+
+    files.write_atomic(_get_config_path(), json.dumps(config).encode("utf-8"))
+
+
+def reload():
+    """ Forgets the config kept in memory, so the next get() reads changes made by other processes """
+    global _config
+
+    with _config_lock:
+        _config = None
+
+
+def get(key, default=None):
+    """ Get value from key in config, default if the config doesn't contain key or it is null """
+    global _config
+
+    with _config_lock:
+        if _config is None:
+            _config = _read()
+
+        value = _config.get(key)
+        return default if value is None else value
 
 
 def save(key, value):
     """ Save a (key, value) pair to the local config file in ~/.lolbuilds/config.json """
-    home_path = os.path.expanduser("~")
+    global _config
 
-    try:
-        os.makedirs(os.path.join(home_path, ".lolbuilds"))
-
-    except FileExistsError:
-        # config already exists, open the config dict and add new value
-        with open(os.path.join(home_path, ".lolbuilds", "config.json"), "r") as f:
-            config = json.load(f)
-            config[key] = value
-
-        # save config dict with new value
-        with open(os.path.join(home_path, ".lolbuilds", "config.json"), "w") as f:
-            f.write(json.dumps(config))
-
-    else:
-        # config is created for the first time
-        with open(os.path.join(home_path, ".lolbuilds", "config.json"), "w") as f:
-            config = {}
-            config[key] = value
-            f.write(json.dumps(config))
+    with _config_lock, _lock_file():
+        # read the config again while locked to keep values saved by other processes
+        config = _read()
+        config[key] = value
+        _write(config)
+        _config = config
@@ -0,0 +1,186 @@
+import json
+import os
+import re
+import threading
+
+from utils import config, files, http, snapshot, versions
+
+DDRAGON_URL = "https://ddragon.leagueoflegends.com"
+
+# Summoner's Rift, item classes only include items sold there
+MAP_ID = "11"
+
+# items in the consumables block of every item set, the ones that still exist in the patch are used
+CONSUMABLES = (2003, 2031, 2055, 2138, 2139, 2140)
+
+# trinkets used when Data Dragon can't be reached
+FALLBACK_TRINKETS = (3340, 3363, 3364)
+
+# item ids in image urls, e.g. //opgg-static.akamaized.net/images/lol/item/3153.png?image=q_auto
+ITEM_URL_PATTERN = re.compile(r"/item/(\d+)\.")
+
+_index = None
+_lock = threading.Lock()
+
+
+def normalize(champion_name):
+    """ Returns a champion name in lowercase without spaces and punctuation, e.g. "Kai'Sa" -> "kaisa" """
+    return re.sub(r"[^a-z0-9]", "", champion_name.lower())
+
+
+class Index:
+
+    __slots__ = ("version", "items", "trinkets", "champions")
+
+    def __init__(self, version, items, champions):
+        """
+        Item and champion lookups for one patch, made from the index saved by _download().
+
+        Parameters:
+        - version (str): Data Dragon version, e.g. "10.14.1", None if Data Dragon couldn't be reached
+        - items (dict): {item id (str): {"tags": list, "buyable": bool}}
+        - champions (dict): {normalized id, name or key: Data Dragon id}
+        """
+        self.version = version
+        self.items = frozenset(int(item_id) for item_id in items)
+
+        self.trinkets = frozenset(int(item_id) for item_id, item in items.items()
+                                  if item["buyable"] and "Trinket" in item["tags"])
+
+        self.champions = champions
+
+
+def _get_path(version):
+    return os.path.join(config.get_directory("ddragon"), f"{version}.json")
+
+
+def _get_version(patch):
+    """ Returns the newest Data Dragon version of a patch, e.g. "10.14" -> "10.14.1" """
+    for version in http.get_json(f"{DDRAGON_URL}/api/versions.json"):
+        if version == patch or version.startswith(f"{patch}."):
+            return version
+
+    raise LookupError(f"No Data Dragon version for patch {patch}")
+
+
+def _download(version):
+    """ Downloads the items and champions of a version, and returns the part of them LoLBuilds uses """
+    items = http.get_json(
+        f"{DDRAGON_URL}/cdn/{version}/data/en_US/item.json")["data"]
+    champions = http.get_json(
+        f"{DDRAGON_URL}/cdn/{version}/data/en_US/champion.json")["data"]
+
+    index = {
+        "version": version,
+        "items": {},
+        "champions": {}
+    }
+
+    for item_id, item in items.items():
+        index["items"][item_id] = {
+            "tags": item.get("tags", []),
+            # sold on Summoner's Rift to every champion
+            "buyable": item.get("gold", {}).get("purchasable", False) and item.get("maps", {}).get(MAP_ID, False)
+            and "requiredChampion" not in item
+        }
+
+    # every source names champions differently, e.g. probuilds "MonkeyKing", op.gg "monkeyking" and champion.gg "Wukong"
+    for champion in champions.values():
+        for name in [champion["id"], champion["name"], champion["key"]]:
+            index["champions"][normalize(name)] = champion["id"]
+
+    return index
+
+
+def _load():
+    """ Returns the index of the current patch, downloaded once and saved in ~/.lolbuilds/ddragon """
+    version = _get_version(versions.get_lol_version())
+    path = _get_path(version)
+
+    try:
+        if snapshot.is_recording():
+            # the snapshot needs the Data Dragon files, the saved index would skip them
+            raise OSError(f"Not using {path} while recording")
+        with open(path) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = _download(version)
+        files.write_atomic(path, json.dumps(index).encode("utf-8"))
+
+        # indexes of older patches are not needed anymore
+        for file_name in os.listdir(os.path.dirname(path)):
+            if file_name != os.path.basename(path):
+                try:
+                    os.remove(os.path.join(os.path.dirname(path), file_name))
+                except OSError:
+                    pass
+
+    return Index(index["version"], index["items"], index["champions"])
+
+
+def get_index():
+    """ Returns the index of the current patch, loaded the first time it is needed in a run """
+    global _index
+
+    with _lock:
+        if _index is None:
+            try:
+                _index = _load()
+            except Exception as error:
+                print(
+                    f"ERROR: Could not load Data Dragon, using built-in item ids: {error}")
+                _index = Index(None, {}, {})
+        return _index
+
+
+def is_item(item_id):
+    """
+    Returns True if an item id exists in the current patch, every id counts if Data Dragon couldn't be reached,
+    ids that aren't numbers never do, e.g. a broken data-id scraped from a page
+    """
+    if not str(item_id).isdigit():
+        return False
+    index = get_index()
+    return index.version is None or int(item_id) in index.items
+
+
+def is_trinket(item_id):
+    if not str(item_id).isdigit():
+        return False
+    index = get_index()
+    return int(item_id) in (index.trinkets if index.version is not None else FALLBACK_TRINKETS)
+
+
+def get_trinkets():
+    """ Returns the ids of the trinkets sold on Summoner's Rift, lowest id (the Stealth Ward) first """
+    index = get_index()
+    return sorted(index.trinkets) if index.version is not None else list(FALLBACK_TRINKETS)
+
+
+def get_consumables():
+    return [item_id for item_id in CONSUMABLES if is_item(item_id)]
+
+
+def get_item_id(url):
+    """ Returns the item id (str) in an item image url, None if there is none or it isn't an item in the current patch """
+    match = ITEM_URL_PATTERN.search(url)
+    if match is None or not is_item(match.group(1)):
+        return None
+    return match.group(1)
+
+
+def get_champion_key(champion_name):
+    """
+    Returns the key of a champion that is the same for all sources, whatever name, id or display name a source uses,
+    e.g. "MonkeyKing", "monkeyking" and "Wukong" -> "monkeyking"
+    """
+    name = normalize(champion_name)
+    return normalize(get_index().champions.get(name, name))
+
+
+def reset():
+    """ Forgets the index, the next run checks the patch again """
+    global _index
+
+    with _lock:
+        _index = None
@@ -1,7 +1,17 @@
 import json
 import os
+import tempfile
+import threading
+import time
 
-from utils import config
+from utils import config, ddragon, metrics
+
+# number of threads writing item sets in the background, see utils.scheduler
+DEFAULT_WRITERS = 2
+
+# read once at import, os.umask can only be read by setting it, which would race with threads creating files
+_umask = os.umask(0)
+os.umask(_umask)
 
 
 def _format_skill_order(skill_order):
@@ -49,221 +59,251 @@ def _format_skill_order(skill_order):
         return "Not enough data for this skill order"
 
 
-def save(champion, item_set, version, source_name, roles):
-    """ Saves an item set for a champion for a given role. """
+def get_file_name(item_set, source_name, roles):
+    """ Returns the file name (without extension) of an item set, e.g. championgg_Top """
+    file_name = source_name
+    if roles:
+        file_name += "_" + item_set.role
+    return file_name
 
-    # standard layout for an item set
-    output = {
-        "title": f"{source_name.capitalize()}{(' ' + item_set['role']) if roles else ''} {version}",
-        "type": "custom",
-        "map": "any",
-        "mode": "any",
-        "priority": False,
-        "champion": champion["name"],
-        "blocks": []  # this is where the items goes
-    }
 
-    # add sort_rank if roles are supported, higher sort rank equals higher position in the item set list in-game
-    if roles:
-        output["sortrank"] = item_set["sort_rank"]
+def get_champion_path(champion_name):
+    """ Returns the folder in the League of Legends installation where item sets for a champion are stored """
+    return os.path.join(
+        config.get("path"), f"Config/Champions/{champion_name}/Recommended")
 
-    # most frequent starter items
-    frequent_starters_dict = {}
-    for item_id in item_set["frequent"]["starters"]:
-        if not item_id in frequent_starters_dict:
-            frequent_starters_dict[item_id] = 1
-        else:
-            frequent_starters_dict[item_id] += 1
-
-    frequent_starters = []
-    for item_id, count in frequent_starters_dict.items():
-        frequent_starters.append(
-            {
-                "count": count,
-                "id": item_id
-            }
-        )
-
-    # add trinket to starters
-    frequent_starters.append(
-        {
-            "count": 1,
-            "id": "3340"
-        }
-    )
-
-    output["blocks"].append(
-        {
-            "items": frequent_starters,
-            "type": "Most Frequent Starters"
-        }
-    )
-
-    # highest win % starter items
-    highest_starters_dict = {}
-    for item_id in item_set["highest"]["starters"]:
-        if not item_id in highest_starters_dict:
-            highest_starters_dict[item_id] = 1
-        else:
-            highest_starters_dict[item_id] += 1
-
-    highest_starters = []
-    for item_id, count in highest_starters_dict.items():
-        highest_starters.append(
-            {
-                "count": count,
-                "id": item_id
-            }
-        )
-
-    # add trinket to starters
-    highest_starters.append(
-        {
-            "count": 1,
-            "id": "3340"
-        }
-    )
-
-    output["blocks"].append(
-        {
-            "items": highest_starters,
-            "type": "Highest Win % Starters"
-        }
-    )
-
-    # most frequent full build
-    frequent_full_dict = {}
-    for item_id in item_set["frequent"]["full"]:
-        if not item_id in frequent_full_dict:
-            frequent_full_dict[item_id] = 1
-        else:
-            frequent_full_dict[item_id] += 1
-
-    frequent_full = []
-    for item_id, count in frequent_full_dict.items():
-        frequent_full.append(
-            {
-                "count": count,
-                "id": item_id
-            }
-        )
-
-    output["blocks"].append(
-        {
-            "items": frequent_full,
-            "type": "Most Frequent Build"
-        }
-    )
-
-    # highest win % full build
-    highest_full_dict = {}
-    for item_id in item_set["highest"]["full"]:
-        if not item_id in highest_full_dict:
-            highest_full_dict[item_id] = 1
-        else:
-            highest_full_dict[item_id] += 1
-
-    highest_full = []
-    for item_id, count in highest_full_dict.items():
-        highest_full.append(
-            {
-                "count": count,
-                "id": item_id
-            }
-        )
-
-    output["blocks"].append(
-        {
-            "items": highest_full,
-            "type": "Highest Win % Build"
-        }
-    )
-
-    # add consumables with most frequent skill order in description
-    output["blocks"].append(
-        {
-            "items": [
-                {
-                    "count": 1,
-                    "id": "2003"
-                },
-                {
-                    "count": 1,
-                    "id": "2031"
-                },
-                {
-                    "count": 1,
-                    "id": "2055"
-                },
-                {
-                    "count": 1,
-                    "id": "2138"
-                },
-                {
-                    "count": 1,
-                    "id": "2139"
-                },
-                {
-                    "count": 1,
-                    "id": "2140"
-                }
-            ],
-            "type": "Consumables | Frequent: " + _format_skill_order(item_set["frequent"]["skill_order"])
-        }
-    )
-
-    # add trinkets with highest win % skill order in description
-    output["blocks"].append(
-        {
-            "items": [
-                {
-                    "count": 1,
-                    "id": "3340"
-                },
-                {
-                    "count": 1,
-                    "id": "3363"
-                },
-                {
-                    "count": 1,
-                    "id": "3364"
-                }
-            ],
-            "type": "Trinkets | Wins: " + _format_skill_order(item_set["highest"]["skill_order"])
-        }
-    )
-
-    # save the item set
-    champion_path = os.path.join(
-        config.get("path"), f"Config/Champions/{champion['name']}/Recommended")
-
-    # champion folders are not made by default on MacOS
+
+def get_mode(path):
+    """
+    Returns the permissions a file written to path should get, those of the file it replaces,
+    or those open() would give a new file, e.g. 0o644 with umask 022
+    """
     try:
-        os.makedirs(champion_path)
-    except FileExistsError:
-        pass
+        return os.stat(path).st_mode & 0o777
+    except OSError:
+        return 0o666 & ~_umask
 
-    # example file name: championgg_Top.json
-    file_name = source_name
-    if roles:
-        file_name += "_" + item_set['role']
 
-    item_set_path = os.path.join(
-        champion_path, f"{file_name}.json")
+def write_atomic(path, data, skip_unchanged=True):
+    """
+    Writes bytes to a file by writing a temporary file next to it and renaming it,
+    so a crash never leaves a half-written file behind.
+
+    Returns False without writing if skip_unchanged and the file already contains exactly these bytes.
+    """
+    if skip_unchanged:
+        try:
+            if os.path.getsize(path) == len(data):
+                with open(path, "rb") as f:
+                    if f.read() == data:
+                        return False
+        except OSError:
+            # file doesn't exist yet
+            pass
+
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        # mkstemp makes the file readable by its owner only
+        os.chmod(temp_path, get_mode(path))
+
+        for attempt in range(10):
+            try:
+                os.replace(temp_path, path)
+                break
+            except PermissionError:
+                # on Windows a file can't be replaced while another process is reading it
+                time.sleep(0.05)
+        else:
+            os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+    return True
+
+
+def _dump_block_items(item_ids):
+    """ Returns the items of a block as json objects, with the count of every item id in the order they first appear """
+    counts = {}
+    for item_id in item_ids:
+        counts[item_id] = counts.get(item_id, 0) + 1
+
+    return [f'{{"count": {count}, "id": "{item_id}"}}' for item_id, count in counts.items()]
+
+
+class Template:
+
+    def __init__(self, version, source_name, roles):
+        """
+        The layout of the item sets of one source, made once per import.
+
+        Everything that is the same in every item set (the consumables and trinkets blocks, the block types, the title)
+        is serialized up front, build() only serializes the items, skill orders and champion of an item set.
+        Most champions share one of a few skill orders, so each skill order is only formatted once.
+        The output is byte for byte the same as building the whole layout as a dict and serializing it
+        with json.dumps, see benchmarks/files.py.
+        """
+        self.version = version
+        self.source_name = source_name
+        self.roles = roles
+
+        trinkets = ddragon.get_trinkets()
+        self._trinket = _dump_block_items(trinkets[:1])
+        self._consumables = "[" + \
+            ", ".join(_dump_block_items(ddragon.get_consumables())) + "]"
+        self._trinkets = "[" + ", ".join(_dump_block_items(trinkets)) + "]"
+        self._titles = {}
+        self._types = {}
+
+    def _get_title(self, role):
+        title = self._titles.get(role)
+        if title is None:
+            title = json.dumps(
+                f"{self.source_name.capitalize()}{(' ' + role) if self.roles else ''} {self.version}")
+            self._titles[role] = title
+        return title
+
+    def _get_type(self, block, skill_order):
+        """ Returns the serialized type of the consumables or trinkets block, with the skill order in it """
+        key = (block, skill_order)
+        block_type = self._types.get(key)
+        if block_type is None:
+            block_type = json.dumps(
+                f"{block}: {_format_skill_order(skill_order)}")
+            self._types[key] = block_type
+        return block_type
+
+    def build(self, champion, item_set):
+        """ Returns the item set file of a champion for a role (if supported) as a (path, bytes) tuple """
+        # standard layout for an item set: the starters (with the trinket added) and full builds,
+        # then the consumables and trinkets with the most frequent and highest win % skill orders in their descriptions
+        parts = [
+            '{"title": ', self._get_title(item_set.role),
+            ', "type": "custom", "map": "any", "mode": "any", "priority": false, "champion": ', json.dumps(
+                champion["name"]),
+            ', "blocks": [{"items": [', ", ".join(_dump_block_items(
+                item_set.frequent.starters) + self._trinket),
+            '], "type": "Most Frequent Starters"}, {"items": [', ", ".join(_dump_block_items(
+                item_set.highest.starters) + self._trinket),
+            '], "type": "Highest Win % Starters"}, {"items": [', ", ".join(
+                _dump_block_items(item_set.frequent.full)),
+            '], "type": "Most Frequent Build"}, {"items": [', ", ".join(
+                _dump_block_items(item_set.highest.full)),
+            '], "type": "Highest Win % Build"}, {"items": ', self._consumables,
+            ', "type": ', self._get_type(
+                "Consumables | Frequent", item_set.frequent.skill_order),
+            '}, {"items": ', self._trinkets,
+            ', "type": ', self._get_type(
+                "Trinkets | Wins", item_set.highest.skill_order),
+            "}]"
+        ]
+
+        # add sort_rank if roles are supported, higher sort rank equals higher position in the item set list in-game
+        if self.roles:
+            parts += [', "sortrank": ', json.dumps(item_set.sort_rank)]
+        parts.append("}")
+
+        # example file name: championgg_Top.json
+        item_set_path = os.path.join(
+            get_champion_path(champion["name"]), f"{get_file_name(item_set, self.source_name, self.roles)}.json")
+
+        return item_set_path, "".join(parts).encode("utf-8")
+
+
+class Writer:
+
+    def __init__(self):
+        """
+        Formats and writes the item sets of one import, called from the format and write stages of utils.scheduler.
+
+        Champion folders are only created once, and files that would be written with identical contents are left untouched.
+        """
+        self.written = 0
+
+        self._templates = {}
+        self._directories = set()
+        self._lock = threading.Lock()
+
+    def format(self, champion, item_sets, version, source_name, roles):
+        """ Returns the item set files of a champion as a list of (path, bytes) tuples """
+        key = (version, source_name, roles)
+        with self._lock:
+            template = self._templates.get(key)
+            if template is None:
+                template = self._templates[key] = Template(
+                    version, source_name, roles)
+
+        files = []
+        for item_set in item_sets:
+            with metrics.timer(source_name, "format"):
+                files.append(template.build(champion, item_set))
+        return files
+
+    def write(self, path, data, source_name):
+        """ Writes an item set file returned from format(), returns True if the file changed """
+        champion_path = os.path.dirname(path)
+
+        # champion folders are not made by default on MacOS
+        if champion_path not in self._directories:
+            os.makedirs(champion_path, exist_ok=True)
+            with self._lock:
+                self._directories.add(champion_path)
 
-    with open(item_set_path, "w") as f:
-        f.write(json.dumps(output))
+        with metrics.timer(source_name, "write"):
+            changed = write_atomic(path, data)
+        if changed:
+            metrics.add(source_name, "bytes_written", len(data))
 
+        if changed:
+            with self._lock:
+                self.written += 1
 
-def delete(champion, source_name):
-    """ Deletes item sets for a champion generated by a source. """
+        return changed
+
+
+def find(source_name):
+    """
+    Searches all champion folders for item sets generated by a source, returns a list of (champion_name, file_name) tuples.
+
+    Only used for item sets written before LoLBuilds kept a manifest of its files, see utils.manifest.
+    """
+    found = []
 
     try:
-        champ_path = os.path.join(
-            config.get("path"), f"Config/Champions/{champion['name']}/Recommended")
-        item_sets = os.listdir(champ_path)
+        champion_names = os.listdir(os.path.join(
+            config.get("path"), "Config/Champions"))
+    except FileNotFoundError:
+        return found
+
+    for champion_name in champion_names:
+        try:
+            item_sets = os.listdir(get_champion_path(champion_name))
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+
         for item_set in item_sets:
-            if source_name in item_set:
-                os.remove(os.path.join(champ_path, item_set))
+            file_name, extension = os.path.splitext(item_set)
+            # e.g. opgg.json or opgg_Mid.json
+            if extension == ".json" and (file_name == source_name or file_name.startswith(source_name + "_")):
+                found.append((champion_name, file_name))
+
+    return found
+
+
+def exists(champion_name, file_name):
+    """ Returns True if an item set file exists for a champion """
+    return os.path.isfile(os.path.join(get_champion_path(champion_name), f"{file_name}.json"))
+
+
+def remove(champion_name, file_name):
+    """ Deletes a single item set file for a champion, e.g. remove("Ahri", "opgg_Mid") """
+    try:
+        os.remove(os.path.join(get_champion_path(champion_name), f"{file_name}.json"))
     except FileNotFoundError:
         pass
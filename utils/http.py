@@ -0,0 +1,265 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+from utils import cache, config, ratelimit, snapshot
+
+# number of keep-alive connections kept open per host, can be overridden with "pool_size" in the config
+DEFAULT_POOL_SIZE = 10
+
+TIMEOUT = 30
+
+# number of finished pages and parsed documents kept in memory for the rest of the run
+MEMO_SIZE = 16
+
+_session = None
+_session_lock = threading.Lock()
+
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+# (prefix, replacement) pairs applied to urls before they are sent, see redirect()
+_redirects = []
+
+_stats = {
+    "requests": 0,
+    "cache_hits": 0,
+    "revalidated": 0,
+    "saved": 0,
+    # time.perf_counter() when the first request was sent, to measure startup time
+    "first_request": None,
+}
+_stats_lock = threading.Lock()
+
+
+def _get_session():
+    """ Returns the shared session for this process, creating it on first use """
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            # imported on first use, since requests is slow to import and not needed to start the program
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            pool_size = config.get("pool_size", DEFAULT_POOL_SIZE)
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=max(pool_size, 1),
+                                  pool_maxsize=max(pool_size, 1))
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+
+            # a pool size of 0 disables keep-alive, which makes every request open a new connection
+            if pool_size == 0:
+                session.headers["Connection"] = "close"
+
+            _session = session
+
+        return _session
+
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+class _Flight:
+    """ A value being computed by one thread that other threads can wait for """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+def memoize(key, factory):
+    """
+    Returns factory() for key, computing it only once when several threads ask for the same key.
+
+    Callers asking for a key that is already being computed wait for that result instead of
+    computing it again, and the last MEMO_SIZE results are kept until reset() is called.
+    Each call answered this way counts as "saved" in stats().
+    """
+    with _memo_lock:
+        flight = _memo.get(key)
+        owner = flight is None
+        if owner:
+            flight = _Flight()
+            _memo[key] = flight
+        else:
+            _memo.move_to_end(key)
+
+    if owner:
+        try:
+            flight.value = factory()
+        except Exception as error:
+            flight.error = error
+            # don't remember failures, the next caller tries again
+            with _memo_lock:
+                if _memo.get(key) is flight:
+                    del _memo[key]
+        finally:
+            flight.done.set()
+
+        with _memo_lock:
+            # only evict finished results, pages still in flight are always coalesced
+            finished = [k for k, f in _memo.items() if f.done.is_set()]
+            for k in finished[:max(len(finished) - MEMO_SIZE, 0)]:
+                del _memo[k]
+    else:
+        flight.done.wait()
+        _count("saved")
+
+    if flight.error is not None:
+        raise flight.error
+
+    return flight.value
+
+
+def reset():
+    """ Forgets all memoized pages and per-host limits, called at the start of a new run """
+    with _memo_lock:
+        _memo.clear()
+    ratelimit.reset()
+
+
+def redirect(prefix, replacement):
+    """
+    Sends requests for urls starting with prefix to replacement instead,
+    e.g. redirect("https://euw.op.gg", "http://127.0.0.1:8000/opgg") to run against a local server.
+
+    Caching, memoization and per-host limits still use the original url.
+    """
+    _redirects.append((prefix, replacement))
+
+
+def _rewrite(url):
+    for prefix, replacement in _redirects:
+        if url.startswith(prefix):
+            return replacement + url[len(prefix):]
+    return url
+
+
+def get(url, headers=None):
+    """
+    Sends a GET request through the shared, pooled session and returns the response.
+
+    429 and 5xx responses and connection errors are retried, raises requests.HTTPError
+    if they keep failing and utils.ratelimit.CircuitOpen if the host seems to be down.
+    """
+    if _stats["first_request"] is None:
+        with _stats_lock:
+            if _stats["first_request"] is None:
+                _stats["first_request"] = time.perf_counter()
+
+    session = _get_session()
+    from requests import exceptions
+
+    def send():
+        _count("requests")
+        return session.get(_rewrite(url), headers=headers, timeout=TIMEOUT)
+
+    # limited, retried and stopped per host when it fails too often, see utils.ratelimit
+    response = ratelimit.request(urlsplit(url).netloc, send,
+                                 (exceptions.ConnectionError, exceptions.Timeout))
+
+    # still throttled or failing after all retries
+    if response.status_code == 429 or response.status_code >= 500:
+        response.raise_for_status()
+
+    return response
+
+
+def fetch(url, version=None):
+    """
+    Returns the body of a page as a (bytes, encoding) tuple, fetching it only once when requested concurrently.
+
+    While a snapshot is replayed the body comes from the snapshot instead (as a memoryview), and while one
+    is recorded every body is added to it, see utils.snapshot.
+    """
+    if snapshot.is_replaying():
+        return snapshot.load(url)
+
+    body, encoding = memoize(("fetch", url), lambda: _fetch(url, version))
+    snapshot.record(url, body, encoding)
+    return body, encoding
+
+
+def _fetch(url, version):
+    """
+    Returns the body of a page as a (bytes, encoding) tuple, using the on-disk cache in ~/.lolbuilds/cache.
+
+    Cached pages are keyed by url and version (usually the patch from Source.get_version), used as-is
+    while fresh, and revalidated with If-None-Match / If-Modified-Since when they get stale.
+
+    Pages without a version (e.g. the pages a version is read from) are always revalidated,
+    otherwise a new patch would go unnoticed until they expire.
+    """
+    cached = cache.load(url, version)
+
+    if cached is not None and version is not None and cache.is_fresh(cached[0]):
+        _count("cache_hits")
+        return cached[1], cached[0]["encoding"]
+
+    headers = {}
+    if cached is not None:
+        if cached[0]["etag"]:
+            headers["If-None-Match"] = cached[0]["etag"]
+        if cached[0]["last_modified"]:
+            headers["If-Modified-Since"] = cached[0]["last_modified"]
+
+    response = get(url, headers)
+
+    # page hasn't changed since it was cached
+    if response.status_code == 304 and cached is not None:
+        _count("revalidated")
+        metadata, body = cached
+        cache.store(url, version, body, metadata["encoding"],
+                    metadata["etag"], metadata["last_modified"])
+        return body, metadata["encoding"]
+
+    encoding = response.encoding or response.apparent_encoding
+
+    if response.status_code == 200:
+        cache.store(url, version, response.content, encoding,
+                    response.headers.get("ETag"), response.headers.get("Last-Modified"))
+
+    return response.content, encoding
+
+
+def decode(body, encoding):
+    """ Decodes a body returned from fetch() to text """
+    return str(body, encoding or "utf-8", errors="replace")
+
+
+def get_text(url, version=None):
+    """ Returns the body of a page as text """
+    return decode(*fetch(url, version))
+
+
+def get_json(url, version=None):
+    """ Returns the body of a page parsed as json """
+    return json.loads(decode(*fetch(url, version)))
+
+
+def stats():
+    """
+    Returns request counters for this process.
+
+    "connections" is the number of connections (TCP + TLS handshakes) opened so far,
+    which is lower than "requests" when connections are kept alive and reused.
+    """
+    connections = 0
+    if _session is not None:
+        for adapter in set(_session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    connections += pool.num_connections
+
+    with _stats_lock:
+        return dict(_stats, connections=connections)
@@ -0,0 +1,131 @@
+import threading
+
+from utils import config, files, manifest, metrics, records
+
+
+class Import:
+
+    def __init__(self, source):
+        """
+        Keeps track of an import from one source: which item sets have changed since the last import,
+        writing them, and removing item sets that disappeared from the source.
+
+        Call start(), then format() and write() for every champion, then finish().
+        """
+        self.source = source
+        self.champions = []
+
+        self._previous = {}
+        self._current = {}
+        # (manifest key, fingerprint) of files returned from format() that are not written yet, by path
+        self._pending = {}
+        self._unchanged = 0
+        self._imported_champions = set()
+        self._failed_champions = set()
+        self._writer = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """ Gets the version and champion list of the source, returns the list of champions to import """
+        source = self.source
+
+        # an incremental import only rewrites item sets that changed since the last import,
+        # otherwise all old item sets are removed first
+        if config.get("incremental", True):
+            self._previous = manifest.load(source.name)
+        else:
+            source.delete_item_sets()
+
+        source.version = source.get_version()
+        # champions are kept as slotted records, which can still be read like dicts by the source
+        self.champions = [records.Champion.from_dict(champion)
+                          for champion in source.get_champions()]
+
+        config.save(source.name, source.version)
+
+        self._writer = files.Writer()
+
+        return self.champions
+
+    def format(self, champion, item_sets):
+        """ Returns the files of the item sets of a champion that changed since the last import, as (path, bytes) tuples """
+        source = self.source
+
+        if len(item_sets) > 0:
+            self._imported_champions.add(champion["name"])
+
+        changed = []
+        for item_set in item_sets:
+            file_name = files.get_file_name(
+                item_set, source.name, source.roles)
+            key = manifest.get_key(champion["name"], file_name)
+            fingerprint = manifest.fingerprint(
+                champion, item_set, source.version)
+
+            # unchanged since the last import
+            if self._previous.get(key) == fingerprint and files.exists(champion["name"], file_name):
+                with self._lock:
+                    self._current[key] = fingerprint
+                    self._unchanged += 1
+                continue
+
+            changed.append((item_set, key, fingerprint))
+
+        item_set_files = self._writer.format(champion, [item_set for item_set, _, _ in changed], source.version,
+                                             source.name, source.roles)
+
+        with self._lock:
+            for (path, _), (_, key, fingerprint) in zip(item_set_files, changed):
+                self._pending[path] = (key, fingerprint)
+
+        return item_set_files
+
+    def write(self, path, data):
+        """
+        Writes an item set file returned from format().
+
+        The item set only goes into the manifest once it is written, a file that couldn't be written
+        is written again on the next import.
+        """
+        changed = self._writer.write(path, data, self.source.name)
+
+        with self._lock:
+            key, fingerprint = self._pending.pop(path)
+            self._current[key] = fingerprint
+            if not changed:
+                self._unchanged += 1
+
+    def fail(self, champion):
+        """ Marks a champion that couldn't be imported completely, its old item sets are kept by finish() """
+        self._failed_champions.add(champion["name"])
+
+    def finish(self):
+        """ Removes item sets that disappeared and saves the manifest, call once all item sets are written """
+        source = self.source
+
+        # remove item sets that disappeared from the source, e.g. a role a champion is no longer played in,
+        # but keep old item sets for champions that couldn't be fetched (completely) this time
+        champion_names = set(champion["name"] for champion in self.champions)
+        deleted = 0
+        for key, fingerprint in self._previous.items():
+            if key in self._current:
+                continue
+            champion_name, file_name = manifest.split_key(key)
+            if champion_name in self._failed_champions:
+                self._current[key] = fingerprint
+            elif champion_name in self._imported_champions or champion_name not in champion_names:
+                with metrics.timer(source.name, "delete"):
+                    files.remove(champion_name, file_name)
+                deleted += 1
+            else:
+                self._current[key] = fingerprint
+
+        manifest.save(source.name, self._current)
+
+        source.version = None
+
+        # files still pending could not be written
+        failed = len(self._pending)
+        print(
+            f"Wrote {self._writer.written} item sets from {source.name}, {self._unchanged} unchanged, {deleted} deleted"
+            + (f", {failed} could not be written" if failed > 0 else ""))
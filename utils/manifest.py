@@ -0,0 +1,57 @@
+import hashlib
+import json
+import os
+
+from utils import config, files
+
+
+def _get_path(source_name):
+    return os.path.join(config.get_directory("manifests"), f"{source_name}.json")
+
+
+def get_key(champion_name, file_name):
+    """ Returns the manifest key of an item set file, e.g. "Ahri/opgg_Mid" """
+    return f"{champion_name}/{file_name}"
+
+
+def split_key(key):
+    """ Returns the (champion_name, file_name) tuple of a manifest key """
+    champion_name, file_name = key.split("/", 1)
+    return champion_name, file_name
+
+
+def fingerprint(champion, item_set, version):
+    """
+    Returns a fingerprint of the data that ends up in an item set file.
+
+    Two imports producing the same fingerprint would write identical files,
+    so the file doesn't have to be written again.
+    """
+    data = json.dumps({
+        "path": config.get("path"),
+        "version": version,
+        "champion": champion["name"],
+        "item_set": item_set.to_dict()
+    }, sort_keys=True)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def exists(source_name):
+    """ Returns True if a manifest has been saved for a source """
+    return os.path.isfile(_get_path(source_name))
+
+
+def load(source_name):
+    """ Returns the item sets written by the last import from a source, as a dict of manifest key -> fingerprint """
+    try:
+        with open(_get_path(source_name)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save(source_name, entries):
+    """ Saves the item sets written by an import from a source """
+    # written atomically so an interrupted import never leaves a broken manifest
+    files.write_atomic(_get_path(source_name),
+                       json.dumps(entries).encode("utf-8"))
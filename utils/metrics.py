@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from utils import config, http, parsing, ratelimit, skills
+
+# number of reports kept in ~/.lolbuilds/reports
+REPORTS_KEPT = 20
+
+# upper bounds (ms) of the latency histogram buckets, the last bucket holds everything slower
+BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+_sources = {}
+_lock = threading.Lock()
+_started = time.time()
+
+
+def _get_source(source_name):
+    if source_name not in _sources:
+        _sources[source_name] = {
+            "phases": {},
+            "counters": {}
+        }
+    return _sources[source_name]
+
+
+def record(source_name, phase, seconds):
+    """ Records the latency of one call to a phase, e.g. record("opgg", "get_items", 0.2) """
+    milliseconds = seconds * 1000
+
+    with _lock:
+        phases = _get_source(source_name)["phases"]
+        if phase not in phases:
+            phases[phase] = {
+                "count": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "histogram_ms": [0] * (len(BUCKETS) + 1)
+            }
+
+        stats = phases[phase]
+        stats["count"] += 1
+        stats["total_ms"] += milliseconds
+        stats["max_ms"] = max(stats["max_ms"], milliseconds)
+
+        bucket = len(BUCKETS)
+        for i, bound in enumerate(BUCKETS):
+            if milliseconds <= bound:
+                bucket = i
+                break
+        stats["histogram_ms"][bucket] += 1
+
+
+@contextmanager
+def timer(source_name, phase):
+    """ Records how long the body of a with statement takes as a call to a phase """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(source_name, phase, time.perf_counter() - started)
+
+
+def add(source_name, counter, value=1):
+    """ Adds value to a counter of a source, e.g. add("opgg", "bytes_fetched", 1024) """
+    with _lock:
+        counters = _get_source(source_name)["counters"]
+        counters[counter] = counters.get(counter, 0) + value
+
+
+def maximum(source_name, counter, value):
+    """ Keeps the highest value seen for a counter of a source, e.g. maximum("pipeline", "write_max_queued", 3) """
+    with _lock:
+        counters = _get_source(source_name)["counters"]
+        counters[counter] = max(counters.get(counter, value), value)
+
+
+def reset():
+    """ Clears all numbers, called at the start of a new run """
+    global _started
+
+    with _lock:
+        _sources.clear()
+        _started = time.time()
+
+
+def snapshot():
+    """ Returns all numbers recorded since the last reset() as a json serializable dict """
+    labels = [f"<={bound}" for bound in BUCKETS] + [f">{BUCKETS[-1]}"]
+
+    with _lock:
+        sources = {}
+        for source_name, source in _sources.items():
+            phases = {}
+            for phase, stats in source["phases"].items():
+                phases[phase] = {
+                    "count": stats["count"],
+                    "total_ms": round(stats["total_ms"], 3),
+                    "mean_ms": round(stats["total_ms"] / stats["count"], 3),
+                    "max_ms": round(stats["max_ms"], 3),
+                    "histogram_ms": dict(zip(labels, stats["histogram_ms"]))
+                }
+            sources[source_name] = {
+                "phases": phases,
+                "counters": dict(source["counters"])
+            }
+
+        return {
+            "started": datetime.fromtimestamp(_started).isoformat(timespec="seconds"),
+            "seconds": round(time.time() - _started, 3),
+            "http": http.stats(),
+            "hosts": ratelimit.stats(),
+            "parsing": parsing.stats(),
+            "skills": skills.stats(),
+            "sources": sources
+        }
+
+
+def report():
+    """ Writes the numbers of this run to ~/.lolbuilds/reports/<time>.json and returns the path """
+    data = snapshot()
+    path = os.path.join(config.get_directory("reports"),
+                        f"{datetime.fromtimestamp(_started).strftime('%Y-%m-%d_%H-%M-%S')}.json")
+
+    with open(path, "w") as f:
+        f.write(json.dumps(data, indent=2))
+
+    # remove the oldest reports, file names sort by time
+    reports = sorted(os.listdir(os.path.dirname(path)))
+    for old_report in reports[:max(len(reports) - REPORTS_KEPT, 0)]:
+        try:
+            os.remove(os.path.join(os.path.dirname(path), old_report))
+        except OSError:
+            pass
+
+    return path
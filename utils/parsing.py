@@ -0,0 +1,142 @@
+import threading
+import time
+import tracemalloc
+
+from utils import config
+
+# parser backends in order of preference, the first one installed is used unless "parser" is set in the config
+# lxml is C-backed and several times faster, html.parser is pure python and always available
+BACKENDS = ["lxml", "html.parser"]
+
+_backend = None
+
+_strainers = {}
+
+_stats = {
+    "pages": 0,
+    "bytes": 0,
+    "seconds": 0.0,
+    "slowest": 0.0,
+    "peak_memory": 0
+}
+_stats_lock = threading.Lock()
+
+# parses are serialized while memory is profiled, so the peak of one page isn't mixed up with another page's,
+# fetching and writing threads still allocate at the same time, so it is the peak of the whole process while parsing
+_profile_lock = threading.Lock()
+
+
+def get_backend():
+    """ Returns the name of the parser backend in use """
+    global _backend
+
+    if _backend is None:
+        from bs4 import BeautifulSoup
+
+        configured = config.get("parser")
+        if configured is not None:
+            _backend = configured
+        else:
+            for backend in BACKENDS:
+                try:
+                    BeautifulSoup("", backend)
+                except Exception:
+                    # parser library not installed
+                    continue
+                _backend = backend
+                break
+
+    return _backend
+
+
+def strainer(name, class_):
+    """
+    Returns a restriction that makes parse() only build the elements with tag name and class class_
+    (and everything inside them) instead of the whole page.
+
+    Returned value is hashable, so it can be part of a memoization key.
+    """
+    return (name, class_)
+
+
+def _get_soup_strainer(only):
+    from bs4 import SoupStrainer
+
+    if only not in _strainers:
+        name, class_ = only
+
+        def has_class(value):
+            # depending on the bs4 version the class attribute is either the raw string or a list of classes
+            if value is None:
+                return False
+            if isinstance(value, str):
+                value = value.split()
+            return class_ in value
+
+        _strainers[only] = SoupStrainer(name, {"class": has_class})
+    return _strainers[only]
+
+
+def parse(markup, only=None, backend=None):
+    """
+    Parses html into a BeautifulSoup object.
+
+    Parameters:
+    - markup (str): html to parse
+    - only (tuple): value returned from strainer(), to only parse that part of the page
+    - backend (str): parser backend to use instead of get_backend(), for html that depends on a specific parser
+    """
+    # imported on first use, since bs4 is slow to import and not needed to start the program
+    from bs4 import BeautifulSoup
+
+    backend = backend or get_backend()
+    parse_only = _get_soup_strainer(only) if only is not None else None
+
+    if config.get("profile_parsing"):
+        with _profile_lock:
+            # only traced while parsing, so the rest of the run doesn't pay for tracing every allocation
+            tracing = tracemalloc.is_tracing()
+            if tracing:
+                tracemalloc.clear_traces()
+            else:
+                tracemalloc.start()
+            try:
+                started = time.perf_counter()
+                soup = BeautifulSoup(markup, backend, parse_only=parse_only)
+                elapsed = time.perf_counter() - started
+                peak_memory = tracemalloc.get_traced_memory()[1]
+            finally:
+                if not tracing:
+                    tracemalloc.stop()
+    else:
+        started = time.perf_counter()
+        soup = BeautifulSoup(markup, backend, parse_only=parse_only)
+        elapsed = time.perf_counter() - started
+        peak_memory = 0
+
+    with _stats_lock:
+        _stats["pages"] += 1
+        _stats["bytes"] += len(markup)
+        _stats["seconds"] += elapsed
+        _stats["slowest"] = max(_stats["slowest"], elapsed)
+        _stats["peak_memory"] = max(_stats["peak_memory"], peak_memory)
+
+    return soup
+
+
+def reset():
+    """ Sets all parse counters back to 0, called at the start of an import """
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0
+
+
+def stats():
+    """
+    Returns parse counters since the last reset().
+
+    "peak_memory" (bytes) is the highest memory use of the process while a page was being parsed, which includes
+    what other threads allocated meanwhile, and is only measured when "profile_parsing" is enabled in the config.
+    """
+    with _stats_lock:
+        return dict(_stats, backend=get_backend())
@@ -0,0 +1,312 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from utils import config
+
+# requests per second sent to the same host, can be overridden with "host_rate" in the config
+DEFAULT_RATE = 20
+
+# requests in flight to the same host when a run starts, can be overridden with "host_concurrency" in the config,
+# and the most it can grow to while the host keeps up, can be overridden with "host_max_concurrency"
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_CONCURRENCY = 16
+
+# times a request is retried after a 429, 5xx or connection error, can be overridden with "retries" in the config
+DEFAULT_RETRIES = 3
+
+# retries wait a random time up to BACKOFF_BASE * 2^attempt seconds, at most BACKOFF_CAP
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 10
+
+# longest Retry-After (seconds) that is respected
+MAX_RETRY_AFTER = 60
+
+# a response this many times slower than the fastest one so far (and slower than SLOW_MIN seconds)
+# means the host is struggling, and fewer requests are sent at once
+SLOW_FACTOR = 4
+SLOW_MIN = 0.5
+
+# the concurrency is lowered at most once per DECREASE_INTERVAL seconds, one burst of errors only counts once
+DECREASE_INTERVAL = 1
+
+# failures in a row before no more requests are sent to a host for BREAKER_COOLDOWN seconds
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 30
+
+# outcomes of a request, see Limiter.release()
+OK = "ok"
+THROTTLED = "throttled"
+FAILED = "failed"
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class CircuitOpen(Exception):
+    """ Raised instead of sending a request to a host that failed too many times in a row """
+    pass
+
+
+class Limiter:
+
+    def __init__(self, host, rate, concurrency, max_concurrency):
+        """
+        Limits the requests sent to one host.
+
+        - A token bucket allows rate requests per second, with bursts of up to rate requests.
+        - At most limit requests are in flight. The limit grows by about one for every limit successful
+          requests, and is halved on 429 and 5xx responses and connection errors (AIMD), or lowered
+          when responses get slow.
+        - A 429 response with Retry-After pauses all requests to the host.
+        - After BREAKER_THRESHOLD failures in a row the circuit opens, and requests fail with CircuitOpen
+          for BREAKER_COOLDOWN seconds. Then one request is let through, and the circuit closes if it succeeds.
+        """
+        self.host = host
+        self.rate = rate
+        self.limit = concurrency
+        self.max_concurrency = max_concurrency
+
+        self._condition = threading.Condition()
+        self._tokens = rate
+        self._refilled = time.monotonic()
+        self._in_flight = 0
+        self._paused_until = 0
+        self._decreased = 0
+        self._fastest = None
+
+        self._failures = 0
+        self._opened_until = None
+        self._trial = False
+
+        self._stats = {
+            "requests": 0,
+            "throttled": 0,
+            "failed": 0,
+            "retries": 0,
+            "circuit_opened": 0,
+            "waited_seconds": 0.0,
+            "max_in_flight": 0,
+        }
+
+    def _refill(self, now):
+        self._tokens = min(self.rate, self._tokens +
+                           (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def acquire(self):
+        """
+        Waits until a request may be sent, raises CircuitOpen if the host is considered down.
+
+        Returns True if the request finds out if the host is back after the circuit opened, pass it on to release().
+        """
+        started = time.monotonic()
+
+        with self._condition:
+            while True:
+                now = time.monotonic()
+
+                if self._opened_until is not None:
+                    # only one request is let through to find out if the host is back
+                    if now < self._opened_until or self._trial:
+                        raise CircuitOpen(
+                            f"{self.host} failed {self._failures} times in a row, not sending more requests for now")
+
+                self._refill(now)
+
+                if now < self._paused_until:
+                    timeout = self._paused_until - now
+                elif self._in_flight >= max(int(self.limit), 1):
+                    # woken up by release()
+                    timeout = None
+                elif self._tokens < 1:
+                    timeout = (1 - self._tokens) / self.rate
+                else:
+                    break
+
+                self._condition.wait(timeout)
+
+            trial = self._opened_until is not None
+            if trial:
+                self._trial = True
+
+            self._tokens -= 1
+            self._in_flight += 1
+            self._stats["requests"] += 1
+            self._stats["waited_seconds"] += now - started
+            self._stats["max_in_flight"] = max(
+                self._stats["max_in_flight"], self._in_flight)
+
+            return trial
+
+    def _decrease(self, factor, now):
+        if now - self._decreased >= DECREASE_INTERVAL:
+            self.limit = max(self.limit * factor, 1)
+            self._decreased = now
+
+    def release(self, seconds, outcome=None, retry_after=None, trial=False):
+        """
+        Frees the slot of a finished request, and adapts the limit to how it went.
+
+        Parameters:
+        - seconds (float): how long the request took
+        - outcome (str): OK, THROTTLED (429) or FAILED (5xx, connection error), None doesn't change anything
+        - retry_after (float): seconds to pause all requests to the host, from a Retry-After header
+        - trial (bool): the value returned by acquire()
+        """
+        now = time.monotonic()
+
+        with self._condition:
+            self._in_flight -= 1
+
+            if outcome == OK:
+                self._failures = 0
+                self._opened_until = None
+
+                slow = self._fastest is not None and seconds > max(
+                    SLOW_FACTOR * self._fastest, SLOW_MIN)
+                self._fastest = seconds if self._fastest is None else min(
+                    self._fastest, seconds)
+
+                if slow:
+                    self._decrease(0.75, now)
+                else:
+                    self.limit = min(self.limit + 1 / self.limit,
+                                     self.max_concurrency)
+
+            elif outcome == THROTTLED:
+                # the host is up, just asking for fewer requests
+                self._stats["throttled"] += 1
+                self._decrease(0.5, now)
+
+            elif outcome == FAILED:
+                self._stats["failed"] += 1
+                self._failures += 1
+                self._decrease(0.5, now)
+
+                if self._failures >= BREAKER_THRESHOLD or trial:
+                    if self._opened_until is None or trial:
+                        self._stats["circuit_opened"] += 1
+                    self._opened_until = now + BREAKER_COOLDOWN
+
+            if retry_after is not None:
+                self._paused_until = max(
+                    self._paused_until, now + retry_after)
+
+            if trial:
+                self._trial = False
+            self._condition.notify_all()
+
+    def count_retry(self):
+        with self._condition:
+            self._stats["retries"] += 1
+
+    def stats(self):
+        with self._condition:
+            return dict(self._stats,
+                        waited_seconds=round(self._stats["waited_seconds"], 3),
+                        concurrency=round(self.limit, 2),
+                        circuit_open=self._opened_until is not None)
+
+
+def get_limiter(host):
+    """ Returns the limiter of a host, created with the settings from the config the first time it is needed """
+    with _limiters_lock:
+        if host not in _limiters:
+            concurrency = max(config.get("host_concurrency", DEFAULT_CONCURRENCY), 1)
+            _limiters[host] = Limiter(host,
+                                      max(config.get("host_rate", DEFAULT_RATE), 0.1),
+                                      concurrency,
+                                      max(config.get("host_max_concurrency", DEFAULT_MAX_CONCURRENCY), concurrency))
+        return _limiters[host]
+
+
+def _get_retry_after(response):
+    """ Returns the seconds to wait from the Retry-After header of a response, or None """
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+
+    try:
+        seconds = float(value)
+    except ValueError:
+        # an http date
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+
+    return min(max(seconds, 0), MAX_RETRY_AFTER)
+
+
+def _get_backoff(attempt):
+    """ Returns the seconds to wait before a retry, random so retries from many threads don't arrive at once """
+    return random.uniform(0, min(BACKOFF_BASE * 2 ** attempt, BACKOFF_CAP))
+
+
+def request(host, send, retryable=()):
+    """
+    Sends a request to host through its limiter, retrying 429 and 5xx responses and errors in retryable.
+
+    Parameters:
+    - host (str): the host the request is sent to, e.g. "euw.op.gg"
+    - send (function): sends the request and returns the response
+    - retryable (tuple): exception types that are retried, e.g. connection errors and timeouts
+
+    Returns the last response, which is a 429 or 5xx response if all retries failed.
+    Raises CircuitOpen if the host failed too many times in a row.
+    """
+    limiter = get_limiter(host)
+    retries = config.get("retries", DEFAULT_RETRIES)
+
+    attempt = 0
+    while True:
+        trial = limiter.acquire()
+        started = time.perf_counter()
+
+        try:
+            response = send()
+        except retryable:
+            limiter.release(time.perf_counter() - started, FAILED, trial=trial)
+            if attempt >= retries:
+                raise
+            delay = _get_backoff(attempt)
+        except BaseException:
+            limiter.release(time.perf_counter() - started, trial=trial)
+            raise
+        else:
+            seconds = time.perf_counter() - started
+
+            if response.status_code == 429:
+                retry_after = _get_retry_after(response)
+                limiter.release(seconds, THROTTLED, retry_after, trial)
+            elif response.status_code >= 500:
+                retry_after = _get_retry_after(response)
+                limiter.release(seconds, FAILED, retry_after, trial)
+            else:
+                limiter.release(seconds, OK, trial=trial)
+                return response
+
+            if attempt >= retries:
+                return response
+            delay = retry_after if retry_after is not None else _get_backoff(
+                attempt)
+
+        limiter.count_retry()
+        attempt += 1
+        time.sleep(delay)
+
+
+def reset():
+    """ Forgets all limiters, the next run starts from the settings in the config """
+    with _limiters_lock:
+        _limiters.clear()
+
+
+def stats():
+    """ Returns the counters and current concurrency of every host """
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+
+    return {limiter.host: limiter.stats() for limiter in limiters}
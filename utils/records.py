@@ -0,0 +1,108 @@
+from array import array
+
+# type code of the arrays holding item ids, unsigned 32 bit ints
+ITEM_ID_TYPE = "I"
+
+
+def to_item_ids(items):
+    """ Returns item ids from a source (e.g. ["3153", "3006"]) as an array of ints, leaving out ids that aren't numbers """
+    return array(ITEM_ID_TYPE, [int(item) for item in items
+                                if item is not None and str(item).isdigit()])
+
+
+class Champion:
+
+    __slots__ = ("name", "display_name", "id", "roles")
+
+    def __init__(self, name, display_name, id=None, roles=None):
+        """
+        A champion returned from Source.get_champions.
+
+        Can be used like the dict it was made from, e.g. champion["name"], so sources don't have to change.
+        Raises KeyError for "id" and "roles" if the source didn't give them.
+        """
+        self.name = name
+        self.display_name = display_name
+        self.id = id
+        self.roles = roles
+
+    @classmethod
+    def from_dict(cls, champion):
+        return cls(champion["name"], champion["display_name"],
+                   champion.get("id"), champion.get("roles"))
+
+    def __getitem__(self, key):
+        if key not in self.__slots__ or getattr(self, key) is None:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.__slots__
+                if getattr(self, key) is not None}
+
+
+class Build:
+
+    __slots__ = ("full", "starters", "skill_order")
+
+    def __init__(self, full, starters, skill_order):
+        """
+        One build of an item set.
+
+        Parameters:
+        - full (array): item ids of the full build
+        - starters (array): item ids of the starter items
+        - skill_order (str): skills in the order they are leveled, e.g. "qweqqrqqwwrwweeree"
+        """
+        self.full = full
+        self.starters = starters
+        self.skill_order = skill_order
+
+    @classmethod
+    def from_source(cls, items, skill_order):
+        """ Makes a build from the items and skill order lists returned from a source """
+        return cls(to_item_ids(items["full"]), to_item_ids(items["starters"]),
+                   "".join(skill_order).lower())
+
+    def to_dict(self):
+        return {
+            "full": self.full.tolist(),
+            "starters": self.starters.tolist(),
+            "skill_order": self.skill_order
+        }
+
+
+class ItemSet:
+
+    __slots__ = ("frequent", "highest", "role", "sort_rank")
+
+    def __init__(self, frequent, highest, role=None, sort_rank=None):
+        """
+        The item set of a champion (and role, if the source has roles), written to one file.
+
+        Parameters:
+        - frequent (Build): most frequent build
+        - highest (Build): highest win % build
+        - role (str): role of the item set, None if the source doesn't categorize item sets by role
+        - sort_rank (int): position in the item set list in-game, higher is higher up
+        """
+        self.frequent = frequent
+        self.highest = highest
+        self.role = role
+        self.sort_rank = sort_rank
+
+    def to_dict(self):
+        item_set = {
+            "frequent": self.frequent.to_dict(),
+            "highest": self.highest.to_dict()
+        }
+        if self.role is not None:
+            item_set["role"] = self.role
+            item_set["sort_rank"] = self.sort_rank
+        return item_set
@@ -0,0 +1,401 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import zip_longest
+
+from utils import cache, config, files, http, importer, metrics, parsing, ratelimit, skills
+
+# number of (source, champion, role) units imported at once across all sources, can be overridden with "concurrency" in the config
+DEFAULT_CONCURRENCY = 8
+
+# number of workers formatting item sets, formatting is fast compared to fetching
+FORMATTERS = 1
+
+
+def _get_units(source, champions):
+    """ Splits the import from a source into (champion, role, sort_rank) units, one per item set """
+    for champion in champions:
+        if source.roles:
+            for counter, role in enumerate(champion["roles"]):
+                # higher sort rank equals higher position in the item set list in-game
+                yield champion, role, 10 - counter
+        else:
+            yield champion, None, None
+
+
+def _failure(source, champion, role, error):
+    """ Returns a failure in the format returned by run() """
+    return {
+        "source": source.name,
+        "champion": champion["display_name"] if champion is not None else None,
+        "role": role,
+        "error": error
+    }
+
+
+class _Queue:
+
+    def __init__(self, name, size):
+        """
+        Bounded queue feeding a stage of the pipeline in _run().
+
+        The stage before it waits when the queue is full, and that time is recorded as "<name>_blocked"
+        under the "pipeline" source in utils.metrics, so a slow stage shows up as the stage before it being blocked.
+        """
+        import asyncio
+
+        self.name = name
+        self._queue = asyncio.Queue(max(size, 1))
+
+    async def put(self, item):
+        started = time.perf_counter()
+        await self._queue.put(item)
+        if item is not None:
+            metrics.record("pipeline", f"{self.name}_blocked",
+                           time.perf_counter() - started)
+            metrics.maximum("pipeline", f"{self.name}_max_queued",
+                            self._queue.qsize())
+
+    async def get(self):
+        return await self._queue.get()
+
+
+def _get_pipeline_stats():
+    """ Returns the pipeline numbers recorded by utils.metrics so far """
+    return metrics.snapshot()["sources"].get("pipeline", {"phases": {}, "counters": {}})
+
+
+def _interleave(units_per_source):
+    """ Yields the units of all sources in turn, so every source progresses at the same pace """
+    for units in zip_longest(*units_per_source):
+        for unit in units:
+            if unit is not None:
+                yield unit
+
+
+def _defer(units, sharing):
+    """
+    Yields the units in the same order, except units of sources using shared skill orders,
+    which come after all units of the same champion from sources sharing them.
+
+    Parameters:
+    - units (iterable): (source_import, champion, role, sort_rank) units
+    - sharing (dict): number of units from sources sharing skill orders, by utils.skills key of the champion
+    """
+    remaining = dict(sharing)
+    deferred = {}
+
+    for unit in units:
+        source = unit[0].source
+        key = skills.normalize(unit[1]["name"])
+
+        if source.uses_skill_orders and remaining.get(key, 0) > 0:
+            deferred.setdefault(key, []).append(unit)
+            continue
+
+        yield unit
+
+        if source.shares_skill_orders:
+            remaining[key] -= 1
+            if remaining[key] == 0:
+                yield from deferred.pop(key, [])
+
+    for units in deferred.values():
+        yield from units
+
+
+async def _run(sources, concurrency, derived_sources=()):
+    """
+    Imports item sets from all sources, returns a list of failures.
+
+    Units flow through a pipeline of stages connected by bounded queues, so only a few item sets
+    are in memory at once and each item set is written as soon as it is ready:
+    - fetch: concurrency workers get the item set of a unit (pages are parsed by Source.get_soup's parser threads)
+    - format: FORMATTERS workers turn item sets that changed into files
+    - write: files.DEFAULT_WRITERS workers write the files
+
+    Every item set is also handed to the derived_sources made from its source, see sources.Consensus.
+
+    A unit of a source using skill orders shared by other sources (see utils.skills) waits until the
+    sharing sources have imported the champion, so it always gets the same skill order. It is queued after
+    their units, so the units it waits for are already being fetched.
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    failures = []
+
+    # get the version and champion list of all sources at once
+    async def start(source_import):
+        try:
+            await loop.run_in_executor(None, source_import.start)
+            return source_import
+        except Exception as error:
+            print(
+                f"ERROR: Could not get the champion list from {source_import.source.name}: {error}")
+            failures.append(_failure(source_import.source, None, None, error))
+            return None
+
+    imports = await asyncio.gather(*(start(importer.Import(source)) for source in sources))
+    imports = [source_import for source_import in imports if source_import is not None]
+
+    # number of units left and item sets found per (source, champion) being imported
+    pending = {}
+    for source_import in imports:
+        for champion, _, _ in _get_units(source_import.source, source_import.champions):
+            key = (source_import.source.name, champion["name"])
+            pending.setdefault(key, {"item_sets": 0, "remaining": 0})
+            pending[key]["remaining"] += 1
+
+    # units left of sources sharing skill orders, and whether they are done, by utils.skills key of the champion
+    sharing = {}
+    shared = {}
+    for source_import in imports:
+        if source_import.source.shares_skill_orders:
+            for champion, _, _ in _get_units(source_import.source, source_import.champions):
+                key = skills.normalize(champion["name"])
+                sharing[key] = sharing.get(key, 0) + 1
+                shared.setdefault(key, asyncio.Event())
+
+    def get_units(source_import):
+        for unit in _get_units(source_import.source, source_import.champions):
+            yield (source_import, *unit)
+
+    units = _defer(_interleave([get_units(source_import)
+                                for source_import in imports]), sharing)
+
+    fetch_queue = _Queue("fetch", concurrency)
+    format_queue = _Queue("format", concurrency)
+    write_queue = _Queue("write", concurrency)
+
+    async def produce():
+        for unit in units:
+            await fetch_queue.put(unit)
+
+    async def fetch_item_set():
+        while True:
+            unit = await fetch_queue.get()
+            if unit is None:
+                break
+            source_import, champion, role, sort_rank = unit
+            source = source_import.source
+            skills_key = skills.normalize(champion["name"])
+
+            if source.uses_skill_orders and skills_key in shared:
+                await shared[skills_key].wait()
+
+            try:
+                item_set = await source.get_item_set_async(champion, role, sort_rank)
+                for derived_source in derived_sources:
+                    if source in derived_source.inputs:
+                        derived_source.collect(source, champion, item_set)
+                await format_queue.put((source_import, champion, item_set))
+            except Exception as error:
+                item_set = None
+                print(
+                    f"ERROR: Build for {champion['display_name']}{' ' + role if role else ''} not found on {source.name}")
+                failures.append(_failure(source, champion, role, error))
+                source_import.fail(champion)
+                for derived_source in derived_sources:
+                    if source in derived_source.inputs:
+                        derived_source.collect_failure(source, champion)
+
+            if source.shares_skill_orders:
+                sharing[skills_key] -= 1
+                if sharing[skills_key] == 0:
+                    shared[skills_key].set()
+
+            key = (source.name, champion["name"])
+            results = pending[key]
+            if item_set is not None:
+                results["item_sets"] += 1
+            results["remaining"] -= 1
+
+            if results["remaining"] == 0:
+                del pending[key]
+                if results["item_sets"] > 0:
+                    print(
+                        f"Imported {champion['display_name']}'s item sets from {source.name}")
+
+    async def format_item_set():
+        while True:
+            item = await format_queue.get()
+            if item is None:
+                break
+            source_import, champion, item_set = item
+
+            try:
+                # only item sets that changed since the last import are formatted
+                item_set_files = await loop.run_in_executor(None, source_import.format, champion, [item_set])
+            except Exception as error:
+                print(
+                    f"ERROR: Could not save {champion['display_name']}'s item sets from {source_import.source.name}: {error}")
+                failures.append(_failure(source_import.source,
+                                         champion, item_set.role, error))
+                source_import.fail(champion)
+                continue
+
+            for path, data in item_set_files:
+                await write_queue.put((source_import, champion, item_set, path, data))
+
+    async def write_file():
+        while True:
+            item = await write_queue.get()
+            if item is None:
+                break
+            source_import, champion, item_set, path, data = item
+
+            try:
+                await loop.run_in_executor(None, source_import.write, path, data)
+            except Exception as error:
+                print(
+                    f"ERROR: Could not save {champion['display_name']}'s item sets from {source_import.source.name}: {error}")
+                failures.append(_failure(source_import.source,
+                                         champion, item_set.role, error))
+                # the file on disk is still the old one, keep it in the manifest as it was
+                source_import.fail(champion)
+
+    async def stop(queue, count):
+        for _ in range(count):
+            await queue.put(None)
+
+    fetchers = [asyncio.ensure_future(fetch_item_set())
+                for _ in range(concurrency)]
+    formatters = [asyncio.ensure_future(format_item_set())
+                  for _ in range(FORMATTERS)]
+    writers = [asyncio.ensure_future(write_file())
+               for _ in range(files.DEFAULT_WRITERS)]
+
+    # every stage stops once the stage before it is done
+    await produce()
+    await stop(fetch_queue, len(fetchers))
+    await asyncio.gather(*fetchers)
+    await stop(format_queue, len(formatters))
+    await asyncio.gather(*formatters)
+    await stop(write_queue, len(writers))
+    await asyncio.gather(*writers)
+
+    for source_import in imports:
+        try:
+            source_import.finish()
+        except Exception as error:
+            print(
+                f"ERROR: Could not save item sets from {source_import.source.name}: {error}")
+            failures.append(_failure(source_import.source, None, None, error))
+
+    return failures
+
+
+def run(sources, concurrency=None):
+    """
+    Imports item sets from a list of sources.
+
+    The import is split into one unit per (source, champion, role), and up to concurrency units
+    from all sources are fetched at once, while finished item sets are formatted and written (see _run).
+    Requests to each host are additionally bounded by utils.ratelimit.
+
+    Returns a list of failures, each a dict with "source", "champion", "role" and "error"
+    (champion and role are None if the whole source failed).
+    """
+    if concurrency is None:
+        concurrency = config.get("concurrency", DEFAULT_CONCURRENCY)
+
+    # imported here, since asyncio is slow to import and not needed for deleting item sets
+    import asyncio
+
+    started = time.perf_counter()
+    before = http.stats()
+    # the parse counters include the slowest page and peak memory, which can't be subtracted like the totals
+    parsing.reset()
+    pipeline_before = _get_pipeline_stats()
+
+    loop = asyncio.new_event_loop()
+
+    # sources that are not ported to asyncio run their blocking get_items/get_skill_order in these threads,
+    # with a thread left for every formatter and writer
+    executor = ThreadPoolExecutor(
+        max_workers=max(concurrency, 1) + FORMATTERS + files.DEFAULT_WRITERS)
+    loop.set_default_executor(executor)
+
+    # sources made from the item sets of other sources are imported after them
+    derived_sources = [source for source in sources if len(source.inputs) > 0]
+    sources_first = [source for source in sources if source not in derived_sources]
+
+    try:
+        failures = loop.run_until_complete(
+            _run(sources_first, max(concurrency, 1), derived_sources))
+
+        # sources whose champion list or manifest failed, their item sets are incomplete
+        failed_sources = set(failure["source"] for failure in failures
+                             if failure["champion"] is None)
+
+        complete = []
+        for derived_source in derived_sources:
+            missing = [source.name for source in derived_source.inputs
+                       if source not in sources_first]
+            failed = [source.name for source in derived_source.inputs
+                      if source.name in failed_sources]
+            if len(missing) > 0:
+                print(
+                    f"ERROR: {derived_source.name.capitalize()} is made from the item sets of {', '.join(missing)}, import them at the same time")
+                failures.append(_failure(derived_source, None, None,
+                                         LookupError(f"{', '.join(missing)} not imported")))
+            elif len(failed) > 0:
+                # importing from the other inputs alone would replace (or remove) the item sets made from all of them
+                print(
+                    f"ERROR: Could not import {', '.join(failed)}, keeping the item sets from {derived_source.name}")
+                failures.append(_failure(derived_source, None, None,
+                                         LookupError(f"{', '.join(failed)} failed")))
+            else:
+                complete.append(derived_source)
+
+        if len(complete) > 0:
+            failures += loop.run_until_complete(
+                _run(complete, max(concurrency, 1)))
+    finally:
+        for derived_source in derived_sources:
+            derived_source.reset()
+        loop.close()
+        executor.shutdown()
+
+    cache.evict()
+    skills.save()
+
+    parsed = parsing.stats()
+    print(
+        f"Parsed {parsed['pages']} pages ({parsed['bytes'] / 1024 / 1024:.1f} MB) with {parsed['backend']} in {parsed['seconds']:.1f}s, "
+        f"{1000 * parsed['seconds'] / max(parsed['pages'], 1):.1f} ms/page on average, {1000 * parsed['slowest']:.1f} ms for the slowest page"
+        + (f", process peak memory while parsing {parsed['peak_memory'] / 1024 / 1024:.1f} MB" if parsed["peak_memory"] else ""))
+
+    # requests vs. connections shows how many handshakes the keep-alive pool saved
+    after = http.stats()
+    print(
+        f"Imported item sets from {', '.join(source.name for source in sources)} in {time.perf_counter() - started:.1f}s "
+        f"({after['requests'] - before['requests']} requests over {after['connections'] - before['connections']} connections, "
+        f"{after['cache_hits'] - before['cache_hits']} pages from cache, {after['saved'] - before['saved']} fetches saved by reuse)")
+
+    # time each stage spent waiting for the next one, a stage that is often blocked is waiting on a slow stage after it
+    pipeline = _get_pipeline_stats()
+    waits = []
+    for stage, waiting in [("fetch", "units waited for a fetcher"), ("parse", "pages waited for a parser"),
+                           ("format", "fetchers waited for the formatter"), ("write", "formatters waited for a writer")]:
+        phase = pipeline["phases"].get(f"{stage}_blocked")
+        if phase is not None:
+            blocked_ms = phase["total_ms"] - \
+                pipeline_before["phases"].get(f"{stage}_blocked", {"total_ms": 0})["total_ms"]
+            max_queued = pipeline["counters"].get(f"{stage}_max_queued")
+            waits.append(f"{waiting} {blocked_ms / 1000:.1f}s" +
+                         (f" (max {max_queued} queued)" if max_queued is not None else ""))
+    if len(waits) > 0:
+        print(f"Pipeline: {', '.join(waits)}")
+
+    # hosts that pushed back, the concurrency is how many requests they were sent at once in the end
+    for host, host_stats in ratelimit.stats().items():
+        if host_stats["throttled"] + host_stats["failed"] > 0:
+            print(
+                f"{host}: {host_stats['throttled']} throttled and {host_stats['failed']} failed requests, {host_stats['retries']} retries, "
+                f"concurrency {host_stats['concurrency']}" + (", stopped sending requests since it seems to be down" if host_stats["circuit_open"] else ""))
+
+    if len(failures) > 0:
+        print(f"{len(failures)} item sets or sources could not be imported, see the errors above")
+
+    return failures
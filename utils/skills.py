@@ -0,0 +1,165 @@
+import json
+import os
+import threading
+import time
+
+from utils import config, ddragon, files, snapshot, versions
+
+# seconds a skill order saved in ~/.lolbuilds/skills.json is used, can be overridden with "skills_ttl" in the config
+DEFAULT_TTL = 7 * 24 * 60 * 60
+
+# skill orders by normalized champion name, as {"skill_order": dict, "version": str, "rank": int, "stored": unix time}
+_orders = {}
+_stored = None
+_changed = False
+_lock = threading.Lock()
+
+_stats = {
+    "shared": 0,
+    "stored": 0,
+    "fetched": 0
+}
+
+
+def _get_path():
+    return os.path.join(config.get_directory(), "skills.json")
+
+
+def normalize(champion_name):
+    """ Returns the key of a champion name that is the same for all sources, e.g. "Aurelion Sol" -> "aurelionsol", "Wukong" -> "monkeyking" """
+    return ddragon.get_champion_key(champion_name)
+
+
+def _get_patch():
+    """ Returns the current patch, e.g. "10.20", None if it can't be checked """
+    try:
+        return versions.get_lol_version()
+    except Exception:
+        return None
+
+
+def _load_stored():
+    """
+    Returns the skill orders saved by earlier runs that are not expired and were shared for the current patch,
+    read from disk once
+    """
+    global _stored
+
+    if _stored is None and snapshot.is_active():
+        # a snapshot has to contain the pages of every skill order a run needs, so replays don't depend on this file
+        _stored = {}
+    elif _stored is None:
+        ttl = config.get("skills_ttl", DEFAULT_TTL)
+
+        try:
+            with open(_get_path()) as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            stored = {}
+
+        # without the patch there is no telling which skill orders are outdated, so none are used
+        patch = _get_patch()
+        _stored = {name: entry for name, entry in stored.items()
+                   if patch is not None and entry.get("version") == patch and time.time() - entry["stored"] < ttl}
+
+    return _stored
+
+
+def register(champion_name, skill_order, version, rank=0):
+    """
+    Shares a skill order fetched by a source with the other sources in this run.
+
+    version is the patch the source has the skill order from, e.g. the op.gg version "10.20", later runs only
+    use the saved skill order while it is the current patch. A champion has one shared skill order, the one
+    with the lowest rank wins, e.g. the index of the role in the role list, so the main role is preferred.
+    """
+    global _changed
+
+    if len(skill_order["frequent"]) == 0 and len(skill_order["highest"]) == 0:
+        return
+
+    key = normalize(champion_name)
+
+    with _lock:
+        entry = _orders.get(key)
+        if entry is None or rank < entry["rank"]:
+            _orders[key] = {
+                "skill_order": skill_order,
+                "version": version,
+                "rank": rank,
+                "stored": time.time()
+            }
+            _changed = True
+
+
+def get(champion_name, fetch=None):
+    """
+    Returns the skill order of a champion as {"frequent": list, "highest": list}, in order of preference from:
+    - a source that fetched it earlier in this run (see register())
+    - ~/.lolbuilds/skills.json, saved by earlier runs
+    - fetch(), if given, and the result is shared with the rest of the run
+
+    Returns None if the skill order isn't known and fetch is not given.
+    """
+    key = normalize(champion_name)
+
+    with _lock:
+        entry = _orders.get(key)
+        if entry is not None:
+            _stats["shared"] += 1
+            return entry["skill_order"]
+
+        entry = _load_stored().get(key)
+        if entry is not None:
+            _stats["stored"] += 1
+            return entry["skill_order"]
+
+    if fetch is None:
+        return None
+
+    skill_order = fetch()
+    with _lock:
+        _stats["fetched"] += 1
+    register(champion_name, skill_order, _get_patch(), rank=float("inf"))
+
+    return skill_order
+
+
+def save():
+    """ Saves the skill orders shared in this run to ~/.lolbuilds/skills.json, for the next runs """
+    global _changed
+
+    with _lock:
+        if not _changed:
+            return
+
+        stored = _load_stored()
+        # rank only matters within a run, the next run starts over
+        for name, entry in _orders.items():
+            stored[name] = {
+                "skill_order": entry["skill_order"],
+                "version": entry["version"],
+                "stored": entry["stored"]
+            }
+        data = json.dumps(stored)
+        _changed = False
+
+    files.write_atomic(_get_path(), data.encode("utf-8"))
+
+
+def reset():
+    """ Forgets the skill orders of this run and rereads ~/.lolbuilds/skills.json the next time it is needed """
+    global _stored, _changed
+
+    with _lock:
+        _orders.clear()
+        _stored = None
+        _changed = False
+        for key in _stats:
+            _stats[key] = 0
+
+
+def stats():
+    """ Returns how many skill orders were shared between sources, read from disk or fetched """
+    with _lock:
+        return dict(_stats)
@@ -0,0 +1,195 @@
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+from utils import files
+
+# a snapshot file starts with a header of MAGIC, the format version, and the offset and length of the index,
+# followed by the bodies of all responses one after another, and the index at the end as json:
+# {url: [offset, length, encoding]}
+MAGIC = b"LOLBSNAP"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIQQ")
+
+RECORD = "record"
+REPLAY = "replay"
+
+_mode = None
+_lock = threading.Lock()
+
+# recording: the file bodies are appended to, replaying: the mapped file
+_file = None
+_path = None
+_temp_path = None
+_offset = 0
+_map = None
+_view = None
+
+_index = {}
+
+_stats = {
+    "recorded": 0,
+    "replayed": 0,
+    "missing": 0
+}
+
+
+class SnapshotError(Exception):
+    """ Raised when a snapshot file can't be read """
+    pass
+
+
+def is_recording():
+    return _mode == RECORD
+
+
+def is_replaying():
+    return _mode == REPLAY
+
+
+def is_active():
+    """ Returns True while recording or replaying, when state saved by earlier runs should not change which pages are fetched """
+    return _mode is not None
+
+
+def start_recording(path):
+    """
+    Records the body of every page fetched through utils.http until stop() is called, into a single file at path.
+
+    The file is written next to path and only replaces it when stop() is called, so a crash never leaves
+    half a snapshot behind.
+    """
+    global _mode, _file, _path, _temp_path, _offset
+
+    stop()
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+
+    with _lock:
+        _file = os.fdopen(fd, "wb")
+        # the header is written again with the position of the index when the recording stops
+        _file.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, 0))
+        _offset = HEADER.size
+        _path = path
+        _temp_path = temp_path
+        _index.clear()
+        for key in _stats:
+            _stats[key] = 0
+        _mode = RECORD
+
+
+def start_replaying(path):
+    """
+    Answers every fetch through utils.http from the snapshot at path until stop() is called, without sending any requests.
+
+    The file is memory-mapped, and pages are returned as memoryviews of the mapping without copying them.
+    Raises SnapshotError if the file isn't a snapshot.
+    """
+    global _mode, _file, _map, _view
+
+    stop()
+
+    f = open(path, "rb")
+    try:
+        snapshot_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        # an empty file can't be mapped
+        f.close()
+        raise SnapshotError(f"{path} is not a LoLBuilds snapshot")
+
+    try:
+        magic, format_version, index_offset, index_length = HEADER.unpack_from(
+            snapshot_map)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError("wrong header")
+        index = json.loads(
+            snapshot_map[index_offset:index_offset + index_length])
+    except (struct.error, ValueError) as error:
+        snapshot_map.close()
+        f.close()
+        raise SnapshotError(
+            f"{path} is not a LoLBuilds snapshot ({error})")
+
+    with _lock:
+        _file = f
+        _map = snapshot_map
+        _view = memoryview(snapshot_map)
+        _index.clear()
+        _index.update(index)
+        for key in _stats:
+            _stats[key] = 0
+        _mode = REPLAY
+
+
+def record(url, body, encoding):
+    """ Appends the body of a page to the snapshot while recording, pages that are already in it are skipped """
+    global _offset
+
+    if _mode != RECORD:
+        return
+
+    with _lock:
+        if _mode != RECORD or url in _index:
+            return
+
+        _file.write(body)
+        _index[url] = [_offset, len(body), encoding]
+        _offset += len(body)
+        _stats["recorded"] += 1
+
+
+def load(url):
+    """
+    Returns the body of a page from the snapshot being replayed as a (memoryview, encoding) tuple, like utils.http.fetch.
+
+    Raises LookupError if the page wasn't recorded.
+    """
+    with _lock:
+        entry = _index.get(url) if _mode == REPLAY else None
+        if entry is None:
+            _stats["missing"] += 1
+            raise LookupError(f"{url} is not in the snapshot")
+        _stats["replayed"] += 1
+
+    offset, length, encoding = entry
+    return _view[offset:offset + length], encoding
+
+
+def stop():
+    """ Stops recording or replaying, a recording is written to its path """
+    global _mode, _file, _path, _temp_path, _map, _view
+
+    with _lock:
+        if _mode == RECORD:
+            index = json.dumps(_index).encode("utf-8")
+            _file.write(index)
+            _file.seek(0)
+            _file.write(HEADER.pack(MAGIC, FORMAT_VERSION, _offset, len(index)))
+            _file.close()
+            # mkstemp makes the file readable by its owner only
+            os.chmod(_temp_path, files.get_mode(_path))
+            os.replace(_temp_path, _path)
+
+        elif _mode == REPLAY:
+            _view.release()
+            try:
+                _map.close()
+            except BufferError:
+                # pages from the snapshot are still in use, the mapping is closed when they are gone
+                pass
+            _file.close()
+
+        _mode = None
+        _file = _path = _temp_path = _map = _view = None
+        _index.clear()
+
+
+def stats():
+    """ Returns how many pages were recorded, replayed and asked for but not in the snapshot """
+    with _lock:
+        return dict(_stats)
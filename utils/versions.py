@@ -1,25 +1,73 @@
 import json
-from datetime import date
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-import requests
-from bs4 import BeautifulSoup
-from packaging import version
+from utils import config, files, http, parsing
 
-from utils import config
+# seconds a checked version is reused before checking again, can be overridden with "version_ttl" in the config
+VERSION_TTL = 10 * 60
 
+_cache_lock = threading.Lock()
+
+
+def _get_cache_path():
+    return os.path.join(config.get_directory(), "versions.json")
+
+
+def _read_cache():
+    try:
+        with open(_get_cache_path()) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _cached(key, get_version):
+    """ Returns the version saved for key in ~/.lolbuilds/versions.json if it was checked recently, otherwise calls get_version() """
+    ttl = config.get("version_ttl", VERSION_TTL)
+
+    with _cache_lock:
+        entry = _read_cache().get(key)
+    if entry is not None and time.time() - entry["checked"] < ttl:
+        return entry["version"]
+
+    version = get_version()
+
+    with _cache_lock:
+        cache = _read_cache()
+        cache[key] = {
+            "version": version,
+            "checked": time.time()
+        }
+        files.write_atomic(_get_cache_path(),
+                           json.dumps(cache).encode("utf-8"))
+
+    return version
 
-def check_lolbuilds_version(local_version):
-    """ Compares the local version of LoLBuilds to the latest release from github """
 
-    response = requests.get(
-        "https://github.com/MathiasWold/lolbuilds/releases/latest")
+def get_latest_lolbuilds_version():
+    """ Get the version of the latest release of LoLBuilds from github """
 
-    html = response.text
+    def get_version():
+        html = http.get_text(
+            "https://github.com/MathiasWold/lolbuilds/releases/latest")
 
-    soup = BeautifulSoup(html, "html.parser")
+        soup = parsing.parse(html)
 
-    latest_version = soup.find(
-        "span", {"class": "css-truncate-target"}).text.replace("v", "")
+        return soup.find(
+            "span", {"class": "css-truncate-target"}).text.replace("v", "")
+
+    return _cached("lolbuilds", get_version)
+
+
+def check_lolbuilds_version(local_version, latest_version=None):
+    """ Compares the local version of LoLBuilds to the latest release from github """
+    from packaging import version
+
+    if latest_version is None:
+        latest_version = get_latest_lolbuilds_version()
 
     # if local version is outdated
     if version.parse(local_version) < version.parse(latest_version):
@@ -34,17 +82,27 @@ def check_lolbuilds_version(local_version):
 
 def get_lol_version():
     """ Get current League of Legends version """
-    versions = json.loads(requests.get(
-        "https://ddragon.leagueoflegends.com/api/versions.json").text)
-    # reformats from 10.14.5 to 10.14
-    latest = ".".join(versions[0].split(".")[:2])
-    return latest
 
+    def get_version():
+        versions = http.get_json(
+            "https://ddragon.leagueoflegends.com/api/versions.json")
+        # reformats from 10.14.5 to 10.14
+        return ".".join(versions[0].split(".")[:2])
+
+    return _cached("lol", get_version)
 
-def check_source_version(source, lol_version):
+
+def get_source_version(source):
+    """ Get current version of a source """
+    return _cached(f"source_{source.name}", source.get_version)
+
+
+def check_source_version(source, lol_version, source_version=None):
     """ Compares and prints current source version to LoL version and local imported source version """
 
-    source_version = source.get_version()
+    if source_version is None:
+        source_version = get_source_version(source)
+
     source_outdated = ""
     try:
         if float(lol_version) > float(source_version):
@@ -64,3 +122,36 @@ def check_source_version(source, lol_version):
 
     print(
         f"{source.name.capitalize()} version: {source_version}{source_outdated}, imported version: {local_version}{local_outdated}")
+
+
+def check_versions(local_version, sources):
+    """
+    Checks for new releases of LoLBuilds, and compares the LoL version, source versions and imported versions.
+    All versions are fetched at once, and reused for a few minutes (see VERSION_TTL).
+    """
+
+    def result(future, name):
+        try:
+            return future.result()
+        except Exception as error:
+            print(f"ERROR: Could not check the {name} version: {error}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=len(sources) + 2) as executor:
+        latest_version = executor.submit(get_latest_lolbuilds_version)
+        lol_version = executor.submit(get_lol_version)
+        source_versions = [executor.submit(get_source_version, source)
+                           for source in sources]
+
+    latest_version = result(latest_version, "LoLBuilds")
+    if latest_version is not None:
+        check_lolbuilds_version(local_version, latest_version)
+
+    # compare local item set version to current source and LoL version to check if item sets are outdated
+    lol_version = result(lol_version, "LoL")
+    print(f"Current LoL version: {lol_version}")
+    print()
+    for source, source_version in zip(sources, source_versions):
+        source_version = result(source_version, source.name)
+        if source_version is not None:
+            check_source_version(source, lol_version, source_version)